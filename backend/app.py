@@ -4,11 +4,19 @@ SnapStudy Backend - Fixed version with proper FFmpeg PATH handling
 
 import os
 import sys
+import time
 import logging
 import traceback
-from typing import Optional, Dict, Any
-from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory
+import hashlib
+import uuid
+import random
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+from pathlib import Path, PurePosixPath
+from flask import Flask, request, jsonify, send_from_directory, Response
+from werkzeug.utils import safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -55,11 +63,57 @@ def setup_ffmpeg_path():
 setup_ffmpeg_path()
 
 # Now import video processing libraries
-import whisper
-from video_utils import extract_audio, clip_key_segments
+import numpy as np
+from video_utils import extract_audio, clip_key_segments, package_hls, probe_media
+from streaming_transcriber import (
+    transcribe_windows, stream_pcm_windows, wav_windows, read_segments, MemoryLimitExceeded, DEFAULT_WINDOW_SECONDS,
+)
+from fake_backends import FAKE_BACKENDS, FakeWhisperModel
+if not FAKE_BACKENDS:
+    import whisper
+else:
+    # Orchestration-only mode: no FFmpeg, models, torch or network needed
+    from fake_backends import (
+        fake_extract_audio as extract_audio,
+        fake_clip_key_segments as clip_key_segments,
+        fake_probe_media as probe_media,
+        fake_pcm_windows as stream_pcm_windows,
+        fake_pcm_windows as wav_windows,
+    )
 from summarizer import summarize_text
-from quiz_generator import generate_quiz
+from quiz_generator import generate_quiz_questions, generate_quiz_from_transcript, format_quiz_text, MAX_QUIZ_QUESTIONS
 from translator import translate_text
+from results_store import ResultsStore, hash_file
+from gemini_client import track_usage, summarize_usage
+from captions import write_captions
+from transcription_profiles import resolve_profile, decode_options, time_budget, describe_profile, DEFAULT_PROFILE, DEGRADED_PROFILE
+from resource_governor import ResourceGovernor
+from fingerprint import compute_fingerprint, mismatched_ranges, read_wav_range, FRAME_SECONDS, MIN_ALIGNED_HASHES
+from profiler import profile_job, torch_stage, profile_files
+from checkpoints import JobCheckpoint, list_checkpoints, RUNNING, PARTIAL
+from scheduler import FairScheduler, PRIORITY_CLASSES, DEFAULT_PRIORITY
+
+# Cache lifetime for fingerprinted build assets and generated media
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MEDIA_MAX_AGE = 3600
+HLS_STATE_FILE = "state"   # Packaging state marker inside each job's HLS directory
+
+# What /media may serve: uploads and clips at the top level, generated output by directory
+PUBLIC_UPLOAD_EXTENSIONS = frozenset({".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v", ".mp3", ".m4a", ".ogg", ".flac"})
+PUBLIC_MEDIA_DIRECTORIES = {
+    "captions": frozenset({".vtt", ".srt"}),
+    "hls": frozenset({".m3u8", ".ts", ".m4s", ".jpg"}),
+}
+
+# Message prefixes that mark a stage output as a failure
+STAGE_ERROR_PREFIXES = (
+    "Cannot ", "Text too short", "Summarization error", "Summarization model not available",
+    "Summarization produced no output", "Translation error", "Translation produced no output",
+    "Transcription unavailable", "Transcription completed but no text", "Operation completed but returned no result",
+)
+PRECONDITION_PREFIX = "Cannot "   # A stage skipped because its input stage failed
+REMOTE_RETRY_BACKOFF = 2.0   # Seconds, multiplied by the attempt number
+MODEL_STAGES = ("transcription", "summarization")   # Stages covered by torch op profiling
 
 # Configure logging
 logging.basicConfig(
@@ -78,9 +132,48 @@ class SnapStudyApp:
     def __init__(self):
         self.app = None
         self.whisper_model = None
+        self.results_store = None
+        self.scheduler = None
+        self.media_root = Path(os.getenv("SNAPSTUDY_MEDIA_DIR", "temp")).resolve()
+        # Kept uploads are never evicted, so keeping them (needed for video_url and HLS) is opt-in
+        self.keep_uploads = os.getenv("SNAPSTUDY_KEEP_UPLOADS", "0") == "1"
+        # Optional background stages (HLS packaging) run off the request thread
+        self.hls_enabled = os.getenv("SNAPSTUDY_HLS") == "1"
+        if self.hls_enabled and not self.keep_uploads:
+            logger.warning("SNAPSTUDY_HLS needs SNAPSTUDY_KEEP_UPLOADS=1; HLS packaging is disabled")
+        self.word_timestamps = os.getenv("SNAPSTUDY_WORD_TIMESTAMPS") == "1"
+        # Reuse transcripts of re-encoded or trimmed copies found by audio fingerprint
+        self.fingerprint_enabled = os.getenv("SNAPSTUDY_FINGERPRINT", "1") == "1"
+        # Streaming mode for long recordings: windowed decode with a hard memory ceiling
+        self.streaming_mode = os.getenv("SNAPSTUDY_STREAMING", "auto")  # "auto", "1" or "0"
+        self.streaming_min_bytes = int(os.getenv("SNAPSTUDY_STREAMING_MIN_MB", "200")) * 1024 * 1024
+        # Both paths decode in windows of this length; the decode time budget is checked per window
+        self.streaming_window_seconds = int(os.getenv("SNAPSTUDY_STREAMING_WINDOW_SECONDS", str(DEFAULT_WINDOW_SECONDS)))
+        # Off by default. When set, a streaming job whose RSS passes it stops and fails its
+        # transcription stage (retryable); the process itself keeps serving
+        self.memory_limit_mb = float(os.getenv("SNAPSTUDY_MEMORY_LIMIT_MB", "0")) or None
+        self.streaming_min_seconds = float(os.getenv("SNAPSTUDY_STREAMING_MIN_SECONDS", "3600"))
+        # Pre-flight limits
+        self.max_duration_seconds = float(os.getenv("SNAPSTUDY_MAX_DURATION_SECONDS", str(4 * 3600)))
+        # Checkpointing and retries of remote stages (Gemini, translation)
+        self.checkpoint_root = str(self.media_root / "jobs")
+        self.remote_attempts = int(os.getenv("SNAPSTUDY_REMOTE_ATTEMPTS", "3"))
+        # Opt-in profiling: per request via X-Profile, or a random fraction of all jobs
+        self.profile_root = self.media_root / "profiles"
+        self.profile_sample_rate = float(os.getenv("SNAPSTUDY_PROFILE_SAMPLE_RATE", "0"))
+        # One CPU budget for torch, FFmpeg and the worker pool
+        self.governor = ResourceGovernor.from_env()
+        self.ffmpeg_threads = self.governor.ffmpeg_threads
+        self.background_executor = ThreadPoolExecutor(
+            max_workers=max(1, self.governor.background_workers),
+            thread_name_prefix="snapstudy-background",
+        )
         self.setup_environment()
+        self.setup_storage()
+        self.setup_scheduler()
         self.setup_flask()
         self.setup_whisper()
+        self.resume_interrupted_jobs()
         
     def setup_environment(self) -> None:
         """Setup environment variables and validate dependencies"""
@@ -88,12 +181,21 @@ class SnapStudyApp:
         
         # Validate FFmpeg availability
         import shutil
+        if FAKE_BACKENDS:
+            logger.info("Fake backends enabled - skipping FFmpeg and API key checks")
+            return
         if not shutil.which('ffmpeg'):
             logger.error("FFmpeg not found in PATH after setup")
             raise EnvironmentError(
                 "FFmpeg not found. Please install FFmpeg and ensure it's in your PATH.\n"
                 "Install: winget install 'FFmpeg (Essentials Build)'"
             )
+        # Upload pre-flight depends on ffprobe; without it every upload would look corrupt
+        if not shutil.which('ffprobe'):
+            logger.error("ffprobe not found in PATH after setup")
+            raise EnvironmentError(
+                "ffprobe not found. It ships with FFmpeg; ensure the full FFmpeg bin directory is in your PATH."
+            )
         
         # Validate required environment variables
         if not os.getenv('GEMINI_API_KEY'):
@@ -101,6 +203,30 @@ class SnapStudyApp:
             
         logger.info("Environment configuration validated")
     
+    def setup_storage(self) -> None:
+        """Open the persistent results store"""
+        db_path = os.getenv("SNAPSTUDY_DB_PATH", "snapstudy.db")
+        self.results_store = ResultsStore(db_path)
+    
+    def setup_scheduler(self) -> None:
+        """Start the fair-share processing queue"""
+        # API key (or "ip:<address>") -> fair-queuing weight
+        self.tenant_weights = self._parse_mapping(os.getenv("SNAPSTUDY_TENANT_WEIGHTS", ""), float)
+        # API key -> highest priority class that key may request
+        self.api_key_priorities = self._parse_mapping(os.getenv("SNAPSTUDY_API_KEY_PRIORITIES", ""), str)
+        # Only configured keys become tenants; anything else counts as its client address
+        self.known_api_keys = set(self.api_key_priorities) | {
+            key for key in self.tenant_weights if not key.startswith("ip:")
+        }
+        self.scheduler = FairScheduler(
+            workers=self.governor.workers,
+            tenant_concurrency=int(os.getenv("SNAPSTUDY_TENANT_CONCURRENCY", "1")),
+            tenant_weights={
+                key if key.startswith("ip:") else self._key_tenant(key): weight
+                for key, weight in self.tenant_weights.items()
+            },
+        )
+    
     def setup_flask(self) -> None:
         """Configure Flask application"""
         self.app = Flask(
@@ -110,7 +236,18 @@ class SnapStudyApp:
         )
         
         CORS(self.app, origins=["http://localhost:3000", "http://localhost:3003", "http://127.0.0.1:3000", "http://127.0.0.1:3003"])
-        self.app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
+        # Sized for the multi-hour recordings pre-flight accepts (4 h of 720p is ~2-4 GB);
+        # Werkzeug spools large uploads to disk, so this bounds disk use, not memory
+        self.app.config['MAX_CONTENT_LENGTH'] = int(os.getenv("SNAPSTUDY_MAX_UPLOAD_MB", "4096")) * 1024 * 1024
+        # Behind a reverse proxy, take the client address from X-Forwarded-For so anonymous
+        # users are separate tenants; only enable with trusted proxies, the header is spoofable
+        trusted_proxies = int(os.getenv("SNAPSTUDY_TRUSTED_PROXIES", "0"))
+        if trusted_proxies:
+            self.app.wsgi_app = ProxyFix(self.app.wsgi_app, x_for=trusted_proxies, x_proto=trusted_proxies)
+        # Let a fronting server stream files when it supports X-Sendfile
+        self.app.config['USE_X_SENDFILE'] = os.getenv("SNAPSTUDY_USE_X_SENDFILE") == "1"
+        # nginx internal location prefix for X-Accel-Redirect hand-off (e.g. "/protected-media/")
+        self.accel_redirect_prefix = os.getenv("SNAPSTUDY_ACCEL_REDIRECT")
         
         self.setup_routes()
         logger.info("Flask application configured")
@@ -118,6 +255,11 @@ class SnapStudyApp:
     def setup_whisper(self) -> None:
         """Initialize Whisper model with enhanced error handling"""
         try:
+            if FAKE_BACKENDS:
+                self.whisper_model = FakeWhisperModel()
+                logger.info("Using in-process fake Whisper model")
+                return
+            self.governor.apply_torch_threads()
             logger.info("Loading Whisper model...")
             self.whisper_model = whisper.load_model("base")
             logger.info("Whisper model loaded successfully")
@@ -130,11 +272,25 @@ class SnapStudyApp:
         
         @self.app.route("/")
         def serve_react():
-            return send_from_directory(self.app.static_folder, "index.html")
+            return self._serve_index()
             
         @self.app.errorhandler(404)
         def not_found(e):
-            return send_from_directory(self.app.static_folder, "index.html")
+            # A missing build asset is a real 404; serving index.html there would be cached as immutable
+            if request.path.startswith("/static/"):
+                return e
+            return self._serve_index()
+            
+        @self.app.after_request
+        def add_cache_headers(response):
+            # CRA emits content-hashed file names under /static, so they never change
+            if request.path.startswith("/static/") and response.status_code in (200, 206, 304):
+                response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+            return response
+            
+        @self.app.route("/media/<path:filename>", methods=["GET", "HEAD"])
+        def serve_media(filename):
+            return self._serve_media(filename)
             
         @self.app.route("/health", methods=["GET"])
         def health_check():
@@ -143,6 +299,9 @@ class SnapStudyApp:
                 "status": "healthy",
                 "ffmpeg_available": shutil.which('ffmpeg') is not None,
                 "whisper_available": self.whisper_model is not None,
+                "transcription_profile": describe_profile(DEFAULT_PROFILE),
+                "scheduler": self.scheduler.stats(),
+                "resources": self.governor.report(),
                 "version": "1.0.0"
             })
             
@@ -150,6 +309,62 @@ class SnapStudyApp:
         def process_video():
             return self._process_video_request()
             
+        @self.app.route("/jobs/<job_id>", methods=["GET"])
+        def get_job(job_id):
+            status = self.scheduler.job_status(job_id)
+            if not status:
+                return jsonify({"error": "Job not found"}), 404
+            return jsonify(status), 200
+            
+        @self.app.route("/jobs/<job_id>/profile", methods=["GET"])
+        def get_job_profile(job_id):
+            profile_dir = safe_join(str(self.profile_root), job_id)
+            files = profile_files(profile_dir) if profile_dir else {}
+            fmt = request.args.get("format", "speedscope")
+            if fmt not in files:
+                return jsonify({"error": "Profile not found", "available_formats": list(files)}), 404
+            return send_from_directory(profile_dir, os.path.basename(files[fmt]), as_attachment=True)
+            
+        @self.app.route("/jobs/<job_id>/hls", methods=["GET"])
+        def get_job_hls(job_id):
+            state = self._hls_state(job_id)
+            if not state:
+                return jsonify({"error": "No HLS packaging for this job"}), 404
+            return jsonify({"job_id": job_id, "state": state}), 200
+            
+        @self.app.route("/jobs/<job_id>/retry", methods=["POST"])
+        def retry_job(job_id):
+            return self._retry_job_request(job_id)
+            
+        @self.app.route("/results/<result_id>", methods=["GET"])
+        def get_result(result_id):
+            result = self.results_store.get_result(result_id)
+            if not result:
+                return jsonify({"error": "Result not found"}), 404
+            return jsonify(result), 200
+            
+        @self.app.route("/results", methods=["GET"])
+        def list_results():
+            try:
+                page = self.results_store.list_results(
+                    limit=request.args.get("limit", 20, type=int),
+                    before=request.args.get("before"),
+                    target_lang=request.args.get("lang"),
+                )
+            except ValueError:
+                return jsonify({"error": "Invalid pagination cursor"}), 400
+            return jsonify(page), 200
+            
+        @self.app.route("/search", methods=["GET"])
+        def search_transcripts():
+            query = request.args.get("q", "").strip()
+            if not query:
+                return jsonify({"error": "Missing search query"}), 400
+            hits = self.results_store.search_segments(
+                query, limit=request.args.get("limit", 20, type=int)
+            )
+            return jsonify({"query": query, "hits": hits}), 200
+            
     def _process_video_request(self) -> tuple[Dict[str, Any], int]:
         """Enhanced video processing with detailed error tracking"""
         try:
@@ -163,87 +378,274 @@ class SnapStudyApp:
             
             # Get target language for translation
             target_lang = request.form.get("target_lang", "hi")
+            
+            # Quiz options: "summary" (default) or "transcript" section-by-section mode
+            quiz_options = {
+                "mode": "transcript" if request.form.get("quiz_mode") == "transcript" else "summary",
+                "count": max(1, min(request.form.get("quiz_count", 5, type=int), MAX_QUIZ_QUESTIONS)),
+            }
+            
+            # Whisper decode profile: fast / balanced / accurate
+            transcribe_profile = resolve_profile(request.form.get("transcribe_profile"))
                 
             logger.info(f"Processing video: {file.filename}, target language: {target_lang}")
             
             # Create temp directory and save file
-            temp_dir = Path("temp")
-            temp_dir.mkdir(exist_ok=True)
+            temp_dir = self.media_root
+            temp_dir.mkdir(parents=True, exist_ok=True)
             
-            # Sanitize filename
+            # Sanitize filename; save under a unique name until the content hash is known,
+            # so concurrent uploads of the same filename never overwrite each other
             safe_filename = self._sanitize_filename(file.filename)
-            filepath = temp_dir / safe_filename
+            filepath = temp_dir / f"upload_{uuid.uuid4().hex}{Path(safe_filename).suffix}"
             file.save(str(filepath))
             
             logger.info(f"File saved: {filepath} ({filepath.stat().st_size} bytes)")
             
-            # Process video
-            results = self._enhanced_processing_pipeline(str(filepath), target_lang)
+            # Pre-flight: reject unusable media before any heavy work
+            try:
+                media_info = probe_media(str(filepath))
+            except OSError as e:
+                logger.error(f"ffprobe unavailable: {e}")
+                os.remove(filepath)
+                return jsonify({"error": "Media inspection is unavailable on the server"}), 500
+            rejection = self._preflight_check(media_info)
+            if rejection:
+                message, status_code = rejection
+                logger.info(f"Rejected {file.filename}: {message}")
+                os.remove(filepath)
+                return jsonify({"error": message, "media_info": media_info}), status_code
             
-            # Cleanup
-            self._cleanup_files(str(filepath))
+            # Name the upload by job: concurrent jobs for the same content must not share
+            # their WAV, segments, captions or HLS paths, or one job's cleanup removes the other's
+            content_hash = hash_file(str(filepath))
+            job_id = uuid.uuid4().hex
+            filepath = filepath.replace(temp_dir / f"{job_id}_{safe_filename}")
+            
+            # Reuse a stored result for identical content
+            cached = self.results_store.find_by_hash(content_hash, target_lang)
+            if (
+                cached
+                and cached.get("quiz_options", {"mode": "summary", "count": 5}) == quiz_options
+                and cached.get("transcribe_profile", DEFAULT_PROFILE) == transcribe_profile
+            ):
+                logger.info(f"Reusing stored result {cached['result_id']} for {file.filename}")
+                self._cleanup_files(str(filepath))
+                return jsonify(cached), 200
+            
+            # HLS packaging only needs the validated source, so it starts now, in parallel with
+            # the pipeline, and exactly once per job (retries and resumes reuse these URLs)
+            hls = None
+            if (self.hls_enabled or request.form.get("hls") == "1") and self.keep_uploads and media_info["has_video"]:
+                hls = self._start_hls_packaging(job_id, filepath, media_info)
             
-            return jsonify(results), 200
+            # Process video on the fair-share queue; the cost estimate drives shortest-job-first
+            tenant, priority = self._request_tenant_and_priority()
+            checkpoint = JobCheckpoint.create(self.checkpoint_root, job_id, {
+                "filepath": str(filepath),
+                "filename": file.filename,
+                "content_hash": content_hash,
+                "target_lang": target_lang,
+                "quiz_options": quiz_options,
+                "media_info": media_info,
+                "tenant": tenant,
+                "priority": priority,
+                "hls": hls,
+                "profile": self._requested_profile_mode(),
+                "transcribe_profile": transcribe_profile,
+            })
+            checkpoint.claim()
+            try:
+                results = self._submit_checkpointed_job(checkpoint).future.result()
+                return jsonify(self._finalize_job(checkpoint, results)), 200
+            except Exception:
+                checkpoint.release()
+                raise
             
         except Exception as e:
             logger.error(f"Request processing failed: {e}", exc_info=True)
             return jsonify({"error": f"Processing failed: {str(e)}"}), 500
             
-    def _enhanced_processing_pipeline(self, filepath: str, target_lang: str = "hi") -> Dict[str, Any]:
-        """Enhanced processing pipeline with better error isolation"""
+    def _retry_job_request(self, job_id: str) -> tuple[Dict[str, Any], int]:
+        """Resume a partially failed job from its last completed stage"""
+        checkpoint = JobCheckpoint.load(self.checkpoint_root, job_id)
+        if not checkpoint:
+            return jsonify({"error": "No resumable checkpoint for this job"}), 404
+        if not checkpoint.claim():
+            return jsonify({"error": "Job is already running"}), 409
+        
+        try:
+            logger.info(f"Retrying job {job_id}; completed stages: {list(checkpoint.data['stages'])}")
+            checkpoint.set_status(RUNNING)
+            results = self._submit_checkpointed_job(checkpoint).future.result()
+            return jsonify(self._finalize_job(checkpoint, results)), 200
+        except Exception as e:
+            checkpoint.release()
+            logger.error(f"Retry of job {job_id} failed: {e}", exc_info=True)
+            return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+            
+    def resume_interrupted_jobs(self) -> None:
+        """Requeue jobs that were running when the previous process stopped"""
+        if os.getenv("SNAPSTUDY_RESUME_ON_START", "1") != "1":
+            return
+        
+        for checkpoint in list_checkpoints(self.checkpoint_root, [RUNNING]):
+            if not os.path.exists(checkpoint.params["filepath"]) or not checkpoint.claim():
+                continue
+            logger.info(f"Resuming interrupted job {checkpoint.job_id}")
+            job = self._submit_checkpointed_job(checkpoint)
+            job.future.add_done_callback(
+                lambda future, checkpoint=checkpoint: self._finalize_resumed_job(checkpoint, future)
+            )
+            
+    def _finalize_resumed_job(self, checkpoint: JobCheckpoint, future) -> None:
+        """Store the result of a job resumed at startup (no request is waiting for it)"""
+        try:
+            self._finalize_job(checkpoint, future.result())
+        except Exception as e:
+            checkpoint.release()
+            logger.error(f"Resumed job {checkpoint.job_id} failed: {e}", exc_info=True)
+            
+    def _submit_checkpointed_job(self, checkpoint: JobCheckpoint):
+        """Queue the pipeline for a checkpointed job; completed stages are skipped"""
+        params = checkpoint.params
+        return self.scheduler.submit(
+            self._run_job, checkpoint,
+            tenant=params["tenant"], priority=params["priority"],
+            cost=self._estimate_cost(params["media_info"]), duration=params["media_info"]["duration"],
+            job_id=checkpoint.job_id,
+        )
+        
+    def _run_job(self, checkpoint: JobCheckpoint) -> Dict[str, Any]:
+        """Worker-thread entry point: run the pipeline, under the profiler if requested"""
+        params = checkpoint.params
+        args = (params["filepath"], params["target_lang"], params["quiz_options"], params["media_info"], checkpoint)
+        kwargs = {"transcribe_profile": params.get("transcribe_profile"), "content_hash": params.get("content_hash")}
+        mode = params.get("profile")
+        with self.governor.job_slot():
+            if not mode:
+                return self._enhanced_processing_pipeline(*args, **kwargs)
+            
+            with profile_job(checkpoint.job_id, str(self.profile_root / checkpoint.job_id), torch_ops=mode == "torch"):
+                results = self._enhanced_processing_pipeline(*args, **kwargs)
+        results["profile_url"] = f"/jobs/{checkpoint.job_id}/profile"
+        return results
+        
+    def _requested_profile_mode(self) -> Optional[str]:
+        """Profiling mode for this request: "sampling", "torch" (sampling plus torch ops) or None"""
+        header = request.headers.get("X-Profile", "").lower()
+        if header == "torch":
+            return "torch"
+        if header in ("1", "true", "yes"):
+            return "sampling"
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            return "sampling"
+        return None
+        
+    def _finalize_job(self, checkpoint: JobCheckpoint, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Attach media URLs, persist the result and update the checkpoint"""
+        params = checkpoint.params
+        filepath = Path(params["filepath"])
+        results["job_id"] = checkpoint.job_id
+        results["media_info"] = params["media_info"]
+        
+        # Persist so the result survives a page refresh
+        results["video_url"] = self._media_url(str(filepath)) if self.keep_uploads else None
+        results["clip_urls"] = [self._media_url(clip) for clip in results["clips"]]
+        results["caption_urls"] = {
+            kind: self._media_url(path) for kind, path in results["caption_files"].items()
+        }
+        if isinstance(params.get("hls"), dict):
+            results["hls"] = {**params["hls"], "state": self._hls_state(checkpoint.job_id)}
+        # Keep the checkpoint (and the source it needs) while any stage can still be retried
+        expected = {"transcription", "summarization", "quiz_generation", "translation", "clip_generation"}
+        if results["segments"]:
+            expected.add("captions")
+        finished = expected.issubset(checkpoint.data["stages"])
+        status = self._result_status(results)
+        if status == "completed" and not finished:
+            status = "partial"
+        results["result_id"] = self.results_store.save_result(
+            results, params["content_hash"], params["target_lang"], filename=params["filename"],
+            status=status, result_id=checkpoint.data.get("result_id"),
+        )
+        
+        if finished:
+            checkpoint.remove()
+            self._cleanup_files(str(filepath))
+        else:
+            checkpoint.set_status(PARTIAL, result_id=results["result_id"])
+            checkpoint.release()
+            self._cleanup_files(str(filepath), keep_source=True)
+            logger.info(f"Job {checkpoint.job_id} finished with failed stages; retry with POST /jobs/{checkpoint.job_id}/retry")
+        
+        return results
+            
+    def _enhanced_processing_pipeline(
+        self,
+        filepath: str,
+        target_lang: str = "hi",
+        quiz_options: Optional[Dict[str, Any]] = None,
+        media_info: Optional[Dict[str, Any]] = None,
+        checkpoint: Optional[JobCheckpoint] = None,
+        transcribe_profile: Optional[str] = None,
+        content_hash: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Enhanced processing pipeline with better error isolation
+        
+        With a checkpoint, each stage's output is persisted as it finishes and
+        stages that already completed are restored instead of rerun.
+        """
+        quiz_options = quiz_options or {"mode": "summary", "count": 5}
         results = {
             "transcript": "",
+            "segments": [],
             "summary": "",
             "quiz": "",
+            "quiz_items": [],
+            "quiz_options": quiz_options,
             "translated_summary": "",
-            "clips": []
+            "clips": [],
+            "caption_files": {},
+            "timings": {},
+            "gemini_usage": {},
+            "transcribe_profile": resolve_profile(transcribe_profile)
         }
         
         try:
-            # Step 1: Audio extraction
-            logger.info("Step 1: Extracting audio")
-            audio_path = extract_audio(filepath)
-            if not audio_path or not Path(audio_path).exists():
-                raise RuntimeError("Audio extraction failed - no audio file created")
-            
-            logger.info(f"Audio extracted successfully: {audio_path}")
-            
-            # Step 2: Transcription
-            logger.info("Step 2: Starting transcription")
-            results["transcript"] = self._safe_transcribe(audio_path)
+            # Steps 1-2: Audio extraction and transcription
+            self._run_stage(
+                "transcription", results, checkpoint,
+                lambda: self._transcription_stage(
+                    filepath, media_info, results["timings"], results["transcribe_profile"], content_hash
+                ),
+            )
             
             # Step 3: Summarization
-            logger.info("Step 3: Generating summary")
-            if results["transcript"] and "failed" not in results["transcript"].lower():
-                results["summary"] = self._safe_execute(
-                    summarize_text, results["transcript"]
-                )
-            else:
-                results["summary"] = "Cannot summarize - transcription failed"
+            self._run_stage("summarization", results, checkpoint, lambda: self._summary_stage(results))
             
-            # Step 4: Quiz generation
-            logger.info("Step 4: Generating quiz")
-            if results["summary"] and "failed" not in results["summary"].lower():
-                results["quiz"] = self._safe_execute(
-                    generate_quiz, results["summary"]
-                )
-            else:
-                results["quiz"] = "Cannot generate quiz - summary unavailable"
+            # Step 4: Quiz generation (remote, retried)
+            self._run_stage(
+                "quiz_generation", results, checkpoint,
+                lambda: self._quiz_stage(results, quiz_options), attempts=self.remote_attempts,
+            )
+            
+            # Step 5: Translation (remote, retried)
+            self._run_stage(
+                "translation", results, checkpoint,
+                lambda: self._translation_stage(results, target_lang), attempts=self.remote_attempts,
+            )
             
-            # Step 5: Translation
-            logger.info("Step 5: Translating summary")
-            if results["summary"] and "failed" not in results["summary"].lower():
-                results["translated_summary"] = self._safe_execute(
-                    translate_text, results["summary"], target_lang=target_lang
+            # Step 5b: Captions from the transcription segments (no extra Whisper pass);
+            # the translated track is remote, so retried
+            if results["segments"]:
+                self._run_stage(
+                    "captions", results, checkpoint,
+                    lambda: self._captions_stage(results, filepath, target_lang), attempts=self.remote_attempts,
                 )
-            else:
-                results["translated_summary"] = "Cannot translate - summary unavailable"
             
             # Step 6: Clip generation (optional)
-            logger.info("Step 6: Generating clips")
-            results["clips"] = self._safe_execute(
-                clip_key_segments, filepath
-            ) or []
+            self._run_stage("clip_generation", results, checkpoint, lambda: self._clips_stage(filepath, media_info))
             
             logger.info("Processing pipeline completed successfully")
             return results
@@ -253,41 +655,404 @@ class SnapStudyApp:
             results["transcript"] = f"Processing failed: {str(e)}"
             return results
             
-    def _safe_transcribe(self, audio_path: str) -> str:
-        """Enhanced transcription with better error handling"""
+    def _run_stage(
+        self,
+        name: str,
+        results: Dict[str, Any],
+        checkpoint: Optional[JobCheckpoint],
+        stage,
+        attempts: int = 1,
+    ) -> None:
+        """Run one pipeline stage, or restore its outputs from the checkpoint
+        
+        The stage returns (outputs, succeeded). Only successful stages are
+        checkpointed, so a retry reruns the failed stages and nothing else.
+        """
+        if checkpoint and checkpoint.has(name):
+            saved = checkpoint.get(name)
+            results.update(saved["outputs"])
+            results["timings"][name] = saved["timing"]
+            logger.info(f"Restored stage '{name}' from checkpoint")
+            return
+        
+        logger.info(f"Running stage '{name}'")
+        started = time.perf_counter()
+        for attempt in range(1, attempts + 1):
+            with self.governor.stage(name):
+                if name in MODEL_STAGES:
+                    with torch_stage(name):
+                        outputs, succeeded = stage()
+                else:
+                    outputs, succeeded = stage()
+            if succeeded or attempt == attempts or self._missing_input(outputs):
+                break
+            logger.warning(f"Stage '{name}' failed (attempt {attempt}/{attempts}), retrying")
+            time.sleep(REMOTE_RETRY_BACKOFF * attempt)
+        timing = round(time.perf_counter() - started, 3)
+        
+        results.update(outputs)
+        results["timings"][name] = timing
+        if succeeded and checkpoint:
+            checkpoint.save_stage(name, outputs, timing)
+            
+    def _transcription_stage(
+        self,
+        filepath: str,
+        media_info: Optional[Dict[str, Any]],
+        timings: Dict[str, float],
+        transcribe_profile: str,
+        content_hash: Optional[str] = None,
+    ):
+        if self._use_streaming(filepath, media_info):
+            # Windowed audio decode and transcription in one pass
+            transcript, segments = self._streaming_transcribe(filepath, transcribe_profile)
+            return {"transcript": transcript, "segments": segments}, bool(segments)
+        
+        started = time.perf_counter()
+        audio_path = extract_audio(filepath, audio_only=bool(media_info) and not media_info["has_video"])
+        timings["audio_extraction"] = round(time.perf_counter() - started, 3)
+        if not audio_path or not Path(audio_path).exists():
+            raise RuntimeError("Audio extraction failed - no audio file created")
+        
+        logger.info(f"Audio extracted successfully: {audio_path}")
+        if self.fingerprint_enabled and content_hash:
+            started = time.perf_counter()
+            reused = self._reuse_near_duplicate(audio_path, content_hash, transcribe_profile)
+            timings["fingerprint"] = round(time.perf_counter() - started, 3)
+            if reused:
+                return reused, bool(reused["segments"])
+        
+        transcript, segments = self._safe_transcribe(audio_path, transcribe_profile)
+        return {"transcript": transcript, "segments": segments}, bool(segments)
+        
+    def _reuse_near_duplicate(
+        self, audio_path: str, content_hash: str, transcribe_profile: str
+    ) -> Optional[Dict[str, Any]]:
+        """Fingerprint the audio and, if it matches a stored recording, reuse its transcript
+        
+        Stored segments are shifted by the match offset; only time ranges whose
+        audio differs are transcribed again. Returns None when there is no usable match.
+        """
+        fingerprint = compute_fingerprint(audio_path)
+        if not fingerprint or not len(fingerprint["hashes"]):
+            return None
+        
+        match = self.results_store.match_fingerprint(
+            fingerprint["hashes"], fingerprint["offsets"],
+            exclude_hash=content_hash, min_aligned=MIN_ALIGNED_HASHES,
+        )
+        self.results_store.save_fingerprint(
+            content_hash, fingerprint["hashes"], fingerprint["offsets"], fingerprint["duration"]
+        )
+        # A partial result still has a good transcript; only its later stages failed
+        stored = self.results_store.find_by_hash(match["content_hash"], statuses=("completed", "partial")) if match else None
+        if not stored or not stored.get("segments"):
+            return None
+        if stored.get("transcribe_profile", DEFAULT_PROFILE) != transcribe_profile:
+            logger.info(f"Near-duplicate of {match['content_hash'][:12]} was decoded with another profile; not reusing")
+            return None
+        
+        duration = fingerprint["duration"]
+        shift = match["delta"] * FRAME_SECONDS   # Stored time = this recording's time + shift
+        ranges = mismatched_ranges(
+            fingerprint["offsets"], np.asarray(match["matched_offsets"], dtype=np.int64), duration
+        )
+        logger.info(
+            f"Near-duplicate of {match['content_hash'][:12]} (result {stored['result_id']}, "
+            f"{match['aligned']} aligned hashes, shift {shift:.2f}s); re-transcribing {len(ranges)} range(s)"
+        )
+        
+        # Shift stored segments onto this recording's timeline
+        candidates = []
+        for segment in stored["segments"]:
+            start, end = segment["start"] - shift, segment["end"] - shift
+            if start < 0 or end > duration + 1:
+                continue
+            shifted = {**segment, "start": round(start, 2), "end": round(end, 2)}
+            if segment.get("words"):
+                shifted["words"] = [
+                    {**word, "start": round(word["start"] - shift, 2), "end": round(word["end"] - shift, 2)}
+                    for word in segment["words"]
+                ]
+            candidates.append(shifted)
+        
+        # Stored segments cut by a mismatched range are dropped and the range widened to cover them
+        widened = []
+        for start, end in ranges:
+            for segment in candidates:
+                if segment["start"] < end and segment["end"] > start:
+                    start, end = min(start, segment["start"]), max(end, segment["end"])
+            widened.append((start, end))
+        # Widening can make neighbouring ranges overlap; transcribe each stretch once
+        merged: List[Tuple[float, float]] = []
+        for start, end in sorted(widened):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        widened = merged
+        segments = [
+            segment for segment in candidates
+            if not any(segment["start"] < end and segment["end"] > start for start, end in widened)
+        ]
+        
+        # The stored summary only fits when this copy covers the whole recording unchanged
+        same_content = (
+            not widened
+            and len(candidates) == len(stored["segments"])
+            and abs(duration - match["duration"]) <= 1.0
+        )
+        for start, end in widened:
+            segments.extend(self._transcribe_range(audio_path, start, end, transcribe_profile))
+        segments.sort(key=lambda segment: segment["start"])
+        
+        return {
+            "transcript": " ".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "near_duplicate": {
+                "result_id": stored["result_id"],
+                "content_hash": match["content_hash"],
+                "shift_seconds": round(shift, 2),
+                "aligned_hashes": match["aligned"],
+                "retranscribed_ranges": [[round(start, 2), round(end, 2)] for start, end in widened],
+                "summary": stored.get("summary") if same_content else None,
+            },
+        }
+        
+    def _transcribe_range(
+        self, audio_path: str, start: float, end: float, transcribe_profile: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Transcribe one time range of a WAV; segment times are on the full recording's timeline"""
+        if not self.whisper_model:
+            return []
+        try:
+            audio = read_wav_range(audio_path, start, end)
+            result = self.whisper_model.transcribe(
+                audio, word_timestamps=self.word_timestamps, **decode_options(transcribe_profile)
+            )
+            return self._segments_from_result(result, offset=start)
+        except Exception as e:
+            logger.error(f"Range transcription {start:.1f}-{end:.1f}s failed: {e}", exc_info=True)
+            return []
+        
+    def _summary_stage(self, results: Dict[str, Any]):
+        if not self._is_success(results["transcript"]):
+            return {"summary": "Cannot summarize - transcription failed"}, False
+        # An unchanged near-duplicate keeps the stored summary
+        reused = (results.get("near_duplicate") or {}).get("summary")
+        if reused and self._is_success(reused):
+            logger.info("Reusing summary of near-duplicate recording")
+            return {"summary": reused}, True
+        summary = self._safe_execute(summarize_text, results["transcript"])
+        return {"summary": summary}, self._is_success(summary)
+        
+    def _quiz_stage(self, results: Dict[str, Any], quiz_options: Dict[str, Any]):
+        with track_usage() as gemini_calls:
+            if quiz_options["mode"] == "transcript" and results["segments"]:
+                quiz_items = self._safe_execute(
+                    generate_quiz_from_transcript, results["transcript"],
+                    num_questions=quiz_options["count"], segments=results["segments"]
+                )
+            elif self._is_success(results["summary"]):
+                quiz_items = self._safe_execute(
+                    generate_quiz_questions, results["summary"],
+                    num_questions=quiz_options["count"], segments=results["segments"]
+                )
+            else:
+                quiz_items = "Cannot generate quiz - summary unavailable"
+        
+        outputs = {"gemini_usage": summarize_usage(gemini_calls)}
+        if isinstance(quiz_items, list):
+            outputs.update({"quiz_items": quiz_items, "quiz": format_quiz_text(quiz_items)})
+            return outputs, True
+        outputs["quiz"] = quiz_items
+        return outputs, False
+        
+    def _translation_stage(self, results: Dict[str, Any], target_lang: str):
+        if not self._is_success(results["summary"]):
+            return {"translated_summary": "Cannot translate - summary unavailable"}, False
+        translated = self._safe_execute(translate_text, results["summary"], target_lang=target_lang)
+        return {"translated_summary": translated}, self._is_success(translated)
+        
+    def _captions_stage(self, results: Dict[str, Any], filepath: str, target_lang: str):
+        caption_dir = Path(filepath).parent / "captions" / Path(filepath).stem
+        try:
+            caption_files = write_captions(results["segments"], str(caption_dir), target_lang)
+        except Exception as e:
+            logger.error(f"Caption generation failed: {e}", exc_info=True)
+            return {"caption_files": {}}, False
+        # Without the translated track the stage stays unfinished, so a retry translates again
+        translated = not target_lang or "translated_vtt" in caption_files
+        return {"caption_files": caption_files}, bool(caption_files) and translated
+        
+    def _clips_stage(self, filepath: str, media_info: Optional[Dict[str, Any]] = None):
+        if media_info and not media_info["has_video"]:
+            # Nothing to cut from an audio-only upload
+            return {"clips": []}, True
+        clips = self._safe_execute(clip_key_segments, filepath, threads=self.ffmpeg_threads)
+        # Clips are optional; an empty list is still a finished stage
+        return {"clips": clips if isinstance(clips, list) else []}, True
+        
+    def _result_status(self, results: Dict[str, Any]) -> str:
+        """"completed" only when every stage succeeded; "failed" without a transcript, else "partial"
+        
+        Only completed results are reused for identical uploads.
+        """
+        if not self._is_success(results["transcript"]):
+            return "failed"
+        stage_outputs = (results["summary"], results["translated_summary"])
+        if not results["quiz_items"] or not all(self._is_success(text) for text in stage_outputs):
+            return "partial"
+        return "completed"
+        
+    @staticmethod
+    def _missing_input(outputs: Dict[str, Any]) -> bool:
+        """True when a stage did not run because an earlier stage failed; retrying cannot help"""
+        return any(isinstance(value, str) and value.startswith(PRECONDITION_PREFIX) for value in outputs.values())
+        
+    @staticmethod
+    def _is_success(text: str) -> bool:
+        """Stage outputs are plain strings; failures are recognised by their message prefix"""
+        return bool(text) and not text.startswith(STAGE_ERROR_PREFIXES) and "failed" not in text.lower()
+            
+    def _safe_transcribe(self, audio_path: str, transcribe_profile: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Enhanced transcription with better error handling
+        
+        Returns the transcript text and its timestamped segments
+        """
         if not self.whisper_model:
-            return "Transcription unavailable: Whisper model not loaded"
+            return "Transcription unavailable: Whisper model not loaded", []
         
         try:
             # Verify audio file exists and is readable
             if not os.path.exists(audio_path):
-                return f"Transcription failed: Audio file not found at {audio_path}"
+                return f"Transcription failed: Audio file not found at {audio_path}", []
             
             file_size = os.path.getsize(audio_path)
             if file_size < 1000:  # Less than 1KB
-                return f"Transcription failed: Audio file too small ({file_size} bytes)"
+                return f"Transcription failed: Audio file too small ({file_size} bytes)", []
             
             logger.info(f"Transcribing audio file: {audio_path} ({file_size} bytes)")
             
             # Set environment variables for FFmpeg
             env = os.environ.copy()
             
-            # Transcribe with error handling
-            result = self.whisper_model.transcribe(audio_path)
-            transcript = result.get("text", "").strip()
+            # Windowed decode, so the profile's time budget can degrade the rest of a slow file
+            segments_path = str(Path(audio_path).with_suffix(".segments.jsonl"))
+            stats = transcribe_windows(
+                self.whisper_model,
+                wav_windows(audio_path, self.streaming_window_seconds),
+                segments_path,
+                time_budget=time_budget(transcribe_profile),
+                degraded_options=decode_options(DEGRADED_PROFILE),
+                word_timestamps=self.word_timestamps,
+                **decode_options(transcribe_profile),
+            )
+            segments = read_segments(segments_path)
+            os.remove(segments_path)
+            transcript = " ".join(segment["text"] for segment in segments)
+            if stats["degraded_windows"]:
+                logger.warning(f"{stats['degraded_windows']} window(s) decoded with the degraded profile")
             
             if not transcript:
-                return "Transcription completed but no text was detected"
+                return "Transcription completed but no text was detected", []
             
-            logger.info(f"Transcription successful: {len(transcript)} characters")
-            return transcript
+            logger.info(f"Transcription successful: {len(transcript)} characters, {len(segments)} segments")
+            return transcript, segments
             
         except FileNotFoundError as e:
             logger.error(f"File not found during transcription: {e}")
-            return f"Transcription failed: Required file not found - {str(e)}"
+            return f"Transcription failed: Required file not found - {str(e)}", []
         except Exception as e:
             logger.error(f"Transcription failed: {e}", exc_info=True)
-            return f"Transcription failed: {str(e)}"
+            return f"Transcription failed: {str(e)}", []
+            
+    def _preflight_check(self, media_info: Optional[Dict[str, Any]]) -> Optional[Tuple[str, int]]:
+        """Return (error message, HTTP status) for media the pipeline cannot handle"""
+        if media_info is None:
+            return "Unsupported or corrupt media file", 415
+        if not media_info["has_audio"]:
+            return "No audio track found in the uploaded file", 422
+        if not media_info["duration"]:
+            return "Could not determine media duration", 422
+        if media_info["duration"] > self.max_duration_seconds:
+            return (
+                f"Recording is too long ({media_info['duration'] / 60:.0f} min, "
+                f"limit {self.max_duration_seconds / 60:.0f} min)"
+            ), 413
+        return None
+        
+    def _estimate_cost(self, media_info: Dict[str, Any]) -> float:
+        """Scheduler cost estimate: media seconds, weighted up for video-heavy files
+        
+        Transcription scales with duration; clip encoding adds work proportional
+        to resolution.
+        """
+        cost = media_info["duration"]
+        if media_info["has_video"] and media_info["height"]:
+            cost *= 1 + min(media_info["height"], 2160) / 2160
+        return cost
+        
+    def _segments_from_result(self, result: Dict[str, Any], offset: float = 0.0) -> List[Dict[str, Any]]:
+        """Timestamped segments from a Whisper result, shifted by offset seconds"""
+        segments = []
+        for segment in result.get("segments", []):
+            entry = {
+                "start": round(offset + float(segment["start"]), 2),
+                "end": round(offset + float(segment["end"]), 2),
+                "text": segment["text"].strip(),
+            }
+            if self.word_timestamps:
+                entry["words"] = [
+                    {
+                        "start": round(offset + float(word["start"]), 2),
+                        "end": round(offset + float(word["end"]), 2),
+                        "word": word["word"],
+                    }
+                    for word in segment.get("words", [])
+                ]
+            segments.append(entry)
+        return segments
+        
+    def _use_streaming(self, filepath: str, media_info: Optional[Dict[str, Any]] = None) -> bool:
+        """Decide whether a file goes through the memory-bounded streaming path"""
+        if self.streaming_mode in ("0", "1"):
+            return self.streaming_mode == "1"
+        if media_info and media_info["duration"]:
+            return media_info["duration"] >= self.streaming_min_seconds
+        return os.path.getsize(filepath) >= self.streaming_min_bytes
+        
+    def _streaming_transcribe(self, filepath: str, transcribe_profile: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]]]:
+        """Memory-bounded transcription straight from the video, segments flushed to disk"""
+        if not self.whisper_model:
+            return "Transcription unavailable: Whisper model not loaded", []
+        
+        try:
+            segments_path = str(Path(filepath).with_suffix(".segments.jsonl"))
+            stats = transcribe_windows(
+                self.whisper_model,
+                stream_pcm_windows(filepath, self.streaming_window_seconds),
+                segments_path,
+                memory_limit_mb=self.memory_limit_mb,
+                time_budget=time_budget(transcribe_profile),
+                degraded_options=decode_options(DEGRADED_PROFILE),
+                word_timestamps=self.word_timestamps,
+                **decode_options(transcribe_profile),
+            )
+            logger.info(f"Streaming transcription finished: {stats}")
+            
+            segments = read_segments(segments_path)
+            transcript = " ".join(segment["text"] for segment in segments)
+            if not transcript:
+                return "Transcription completed but no text was detected", []
+            return transcript, segments
+            
+        except MemoryLimitExceeded as e:
+            logger.error(f"Streaming transcription aborted: {e}")
+            return f"Transcription failed: {str(e)}", []
+        except Exception as e:
+            logger.error(f"Streaming transcription failed: {e}", exc_info=True)
+            return f"Transcription failed: {str(e)}", []
             
     def _safe_execute(self, func, *args, **kwargs) -> str:
         """Safely execute functions with comprehensive error handling"""
@@ -298,21 +1063,144 @@ class SnapStudyApp:
             logger.error(f"Function {func.__name__} failed: {e}", exc_info=True)
             return f"{func.__name__} failed: {str(e)}"
             
+    def _request_tenant_and_priority(self) -> Tuple[str, str]:
+        """Identify the tenant (configured API key or client address) and its allowed priority class
+        
+        Unknown keys are ignored, so rotating made-up keys cannot mint fresh tenants
+        past the per-tenant cap. Clients may ask for a lower class with X-Priority,
+        never a higher one than their API key is granted.
+        """
+        api_key = request.headers.get("X-API-Key")
+        if api_key in self.known_api_keys:
+            tenant = self._key_tenant(api_key)
+            allowed = self.api_key_priorities.get(api_key, DEFAULT_PRIORITY)
+        else:
+            tenant = f"ip:{request.remote_addr}"
+            allowed = DEFAULT_PRIORITY
+        
+        requested = request.headers.get("X-Priority") or request.form.get("priority") or allowed
+        if requested not in PRIORITY_CLASSES or PRIORITY_CLASSES[requested] < PRIORITY_CLASSES.get(allowed, 1):
+            requested = allowed
+        return tenant, requested
+        
+    @staticmethod
+    def _key_tenant(api_key: str) -> str:
+        """Tenant id for an API key, without keeping the key itself in job records"""
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+        
+    @staticmethod
+    def _parse_mapping(value: str, cast) -> Dict[str, Any]:
+        """Parse "key:value,key:value" configuration strings"""
+        mapping = {}
+        for item in value.split(","):
+            key, sep, raw = item.strip().rpartition(":")
+            if sep and key:
+                mapping[key] = cast(raw)
+        return mapping
+        
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename for security"""
         import re
         safe_name = re.sub(r'[^\w\-_\.]', '_', filename)
         return safe_name[:100]
         
-    def _cleanup_files(self, filepath: str) -> None:
-        """Clean up temporary files"""
+    def _start_hls_packaging(self, job_id: str, filepath: Path, media_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Queue HLS packaging in the background and return the URLs it will populate
+        
+        The master playlist is an event playlist, so players can start once the
+        first segment of each rendition has been written. Clients poll status_url
+        to learn whether packaging finished or failed.
+        """
+        output_dir = self.media_root / "hls" / job_id
+        self._write_hls_state(output_dir, "packaging")
+        self.background_executor.submit(self._package_hls, filepath, output_dir, media_info)
+        return {
+            "master_playlist_url": self._media_url(str(output_dir / "master.m3u8")),
+            "sprite_url": self._media_url(str(output_dir / "sprite_001.jpg")),
+            "status_url": f"/jobs/{job_id}/hls",
+        }
+        
+    def _package_hls(self, filepath: Path, output_dir: Path, media_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Background-pool entry point: packaging leases its own core slot like a pipeline job"""
+        result = None
+        try:
+            with self.governor.job_slot(), self.governor.stage("hls_packaging"):
+                result = package_hls(
+                    str(filepath), str(output_dir), threads=self.ffmpeg_threads,
+                    has_audio=media_info["has_audio"], source_height=media_info.get("height"),
+                )
+            return result
+        finally:
+            self._write_hls_state(output_dir, "completed" if result else "failed")
+            
+    @staticmethod
+    def _write_hls_state(output_dir: Path, state: str) -> None:
+        """Record packaging progress next to the output (not served; see /jobs/<id>/hls)"""
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / HLS_STATE_FILE).write_text(state, encoding="utf-8")
+        
+    def _hls_state(self, job_id: str) -> Optional[str]:
+        """"packaging", "completed" or "failed"; None if the job never packaged HLS"""
+        output_dir = safe_join(str(self.media_root / "hls"), job_id)
+        try:
+            return (Path(output_dir) / HLS_STATE_FILE).read_text(encoding="utf-8").strip() if output_dir else None
+        except OSError:
+            return None
+        
+    def _serve_index(self):
+        """Serve the React entry point; it must be revalidated so new builds are picked up"""
+        response = send_from_directory(self.app.static_folder, "index.html")
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+        
+    def _media_url(self, path: str) -> str:
+        """Public URL of a file under the media root"""
+        return "/media/" + Path(path).resolve().relative_to(self.media_root).as_posix()
+        
+    def _serve_media(self, filename: str):
+        """Serve uploads and generated clips with Range, ETag and Last-Modified support
+        
+        Bytes are handed to the front server (X-Accel-Redirect / X-Sendfile) when
+        configured, otherwise Werkzeug's file wrapper lets gunicorn use sendfile().
+        """
+        full_path = safe_join(str(self.media_root), filename)
+        if full_path is None or not self._is_public_media(filename) or not os.path.isfile(full_path):
+            return jsonify({"error": "Media not found"}), 404
+            
+        if self.accel_redirect_prefix:
+            response = Response(status=200)
+            response.headers["X-Accel-Redirect"] = self.accel_redirect_prefix.rstrip("/") + "/" + filename
+            response.headers["Content-Type"] = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+            return response
+            
+        return send_from_directory(
+            self.media_root, filename, conditional=True, etag=True, max_age=MEDIA_MAX_AGE
+        )
+        
+    @staticmethod
+    def _is_public_media(filename: str) -> bool:
+        """Only kept uploads, clips, captions and HLS output are served; never checkpoints,
+        profiles, extracted audio or segment spill files"""
+        parts = PurePosixPath(filename).parts
+        suffix = PurePosixPath(filename).suffix.lower()
+        if len(parts) == 1:
+            return suffix in PUBLIC_UPLOAD_EXTENSIONS
+        return suffix in PUBLIC_MEDIA_DIRECTORIES.get(parts[0], ())
+        
+    def _cleanup_files(self, filepath: str, keep_source: bool = False) -> None:
+        """Clean up temporary files (the source video is kept when it is served as media)"""
         try:
-            files_to_clean = [
+            files_to_clean = {
                 filepath,
                 filepath.replace('.mp4', '.wav'),
                 filepath.replace('.avi', '.wav'),
                 filepath.replace('.mov', '.wav'),
-            ]
+                str(Path(filepath).with_suffix(".wav")),
+                str(Path(filepath).with_suffix(".pcm.wav")),
+                str(Path(filepath).with_suffix(".segments.jsonl")),
+            }
+            if self.keep_uploads or keep_source:
+                files_to_clean.discard(filepath)
             
             for file_path in files_to_clean:
                 if os.path.exists(file_path):
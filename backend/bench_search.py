@@ -0,0 +1,114 @@
+"""
+Benchmark script for transcript search latency
+
+Usage:
+    python bench_search.py [--segments 100000] [--queries 200] [--db path/to/snapstudy.db]
+
+Without --db a throwaway database is filled with synthetic lecture segments
+(200 per result, Zipf-distributed vocabulary). Reports indexing time, p50/p95/p99 latency of /search
+queries and of replacing one result's segments, against the 50 ms p95 target.
+"""
+
+import os
+import time
+import tempfile
+import argparse
+
+import numpy as np
+
+from results_store import ResultsStore, STOPWORDS
+
+TARGET_P95_MS = 50.0
+SEGMENTS_PER_RESULT = 200
+
+TOPIC_WORDS = (
+    "gradient descent learning rate backpropagation chain rule layer loss function "
+    "regularization overfitting validation set generalization batch normalization "
+    "activation convolution kernel stride pooling dropout softmax cross entropy label "
+    "probability distribution variance bias optimizer momentum adam weight decay epoch "
+    "training inference embedding attention transformer encoder decoder token sequence "
+    "recurrent network memory cell gate vanishing exploding matrix vector eigenvalue "
+    "derivative integral theorem proof lemma hypothesis experiment sample estimate"
+).split()
+# Spoken text is Zipf-distributed: function words (which search drops) take the top
+# ranks, then a long tail of content words
+VOCABULARY = sorted(STOPWORDS) + TOPIC_WORDS + [f"{word}{n}" for n in range(250) for word in TOPIC_WORDS]
+ZIPF_WEIGHTS = 1.0 / np.arange(1, len(VOCABULARY) + 1)
+
+
+def sample_words(rng: np.random.Generator, count: int):
+    return [VOCABULARY[i] for i in rng.choice(len(VOCABULARY), count, p=ZIPF_WEIGHTS / ZIPF_WEIGHTS.sum())]
+
+
+def synthetic_results(count: int, rng: np.random.Generator):
+    for index in range(0, count, SEGMENTS_PER_RESULT):
+        segments = [
+            {
+                "start": i * 6.0,
+                "end": i * 6.0 + 6.0,
+                "text": " ".join(sample_words(rng, int(rng.integers(8, 20)))),
+            }
+            for i in range(min(SEGMENTS_PER_RESULT, count - index))
+        ]
+        yield {"segments": segments, "transcript": ""}
+
+
+def percentiles(samples) -> str:
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return f"p50 {p50:6.2f} ms   p95 {p95:6.2f} ms   p99 {p99:6.2f} ms"
+
+
+def bench_search():
+    parser = argparse.ArgumentParser(description="Measure transcript search latency")
+    parser.add_argument("--segments", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--db", help="Benchmark an existing database instead of a synthetic one")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.db:
+        store = ResultsStore(args.db)
+    else:
+        store = ResultsStore(os.path.join(tempfile.mkdtemp(prefix="snapstudy-search-"), "bench.db"))
+        print(f"📦 Indexing {args.segments} synthetic segments...")
+        started = time.perf_counter()
+        result_ids = [
+            store.save_result(results, f"bench-{i}", "hi", filename=f"lecture_{i}.mp4")
+            for i, results in enumerate(synthetic_results(args.segments, rng))
+        ]
+        print(f"✅ Indexed in {time.perf_counter() - started:.1f}s")
+
+    # Search-box queries: a few content words, sometimes with a function word mixed in
+    queries = [
+        " ".join(word for word in sample_words(rng, int(rng.integers(2, 8))) if word not in STOPWORDS or rng.random() < 0.2)
+        or TOPIC_WORDS[int(rng.integers(len(TOPIC_WORDS)))]
+        for _ in range(args.queries)
+    ]
+    for query in queries[:10]:
+        store.search_segments(query)   # Warm the page cache
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        store.search_segments(query, limit=20)
+        latencies.append(time.perf_counter() - started)
+
+    print(f"\n📊 Search ({args.queries} queries, limit 20)")
+    print(f"  {percentiles(latencies)}")
+    p95 = np.percentile(latencies, 95) * 1000
+    print(f"  {'✅' if p95 < TARGET_P95_MS else '❌'} p95 target {TARGET_P95_MS:.0f} ms")
+
+    if not args.db:
+        # Replacing a result (a retried job) deletes its old segments through the result_id index
+        replace = []
+        for result_id in rng.choice(result_ids, min(20, len(result_ids)), replace=False):
+            results = next(synthetic_results(SEGMENTS_PER_RESULT, rng))
+            started = time.perf_counter()
+            store.save_result(results, "bench-replaced", "hi", result_id=str(result_id))
+            replace.append(time.perf_counter() - started)
+        print(f"\n📊 Replace one result ({SEGMENTS_PER_RESULT} segments)")
+        print(f"  {percentiles(replace)}")
+
+
+if __name__ == "__main__":
+    bench_search()
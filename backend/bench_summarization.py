@@ -0,0 +1,127 @@
+"""
+Benchmark script comparing summarization with and without the extractive pre-filter
+
+Usage:
+    python bench_summarization.py <transcript.txt|result.json> [reference_summary.txt]
+
+Reports input tokens, latency and ROUGE-1/2/L F1 for both paths. Without a
+reference summary, ROUGE recall against the full transcript is reported
+instead, as a measure of how much of the lecture each summary covers.
+"""
+
+import re
+import sys
+import json
+import time
+from collections import Counter
+from typing import List, Dict
+
+
+def _tokens(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _ngrams(tokens: List[str], n: int) -> Counter:
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+
+def _scores(overlap: float, hypothesis_total: int, reference_total: int) -> Dict[str, float]:
+    precision = overlap / hypothesis_total if hypothesis_total else 0.0
+    recall = overlap / reference_total if reference_total else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+
+def rouge_n(reference: str, hypothesis: str, n: int) -> Dict[str, float]:
+    ref = _ngrams(_tokens(reference), n)
+    hyp = _ngrams(_tokens(hypothesis), n)
+    overlap = sum((ref & hyp).values())
+    return _scores(overlap, sum(hyp.values()), sum(ref.values()))
+
+
+def rouge_l(reference: str, hypothesis: str) -> Dict[str, float]:
+    """Longest common subsequence over word tokens"""
+    ref = _tokens(reference)
+    hyp = _tokens(hypothesis)
+    previous = [0] * (len(hyp) + 1)
+    for ref_word in ref:
+        current = [0]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(previous[j - 1] + 1 if ref_word == hyp_word else max(previous[j], current[j - 1]))
+        previous = current
+    return _scores(previous[-1], len(hyp), len(ref))
+
+
+def load_transcript(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if path.endswith(".json"):
+        return json.loads(content)["transcript"]
+    return content
+
+
+def bench_summarization():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+
+    transcript = load_transcript(sys.argv[1])
+    reference = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "r", encoding="utf-8") as f:
+            reference = f.read()
+
+    print("📦 Loading summarizer...")
+    import summarizer
+    from extractive import select_key_sentences
+
+    if not summarizer.summarizer:
+        print("❌ Summarization model not available")
+        return
+
+    tokenizer = summarizer.summarizer.tokenizer
+    print(f"📄 Transcript: {len(tokenizer.encode(transcript))} tokens")
+
+    budget = summarizer.TOKEN_BUDGET
+    started = time.perf_counter()
+    filtered = select_key_sentences(transcript, budget - 8, count_tokens=summarizer._count_tokens)
+    extract_seconds = time.perf_counter() - started
+    print(f"✂️  Extractive stage: {extract_seconds * 1000:.1f} ms")
+
+    paths = {
+        "truncate": {"prefilter": False},
+        "prefilter": {"prefilter": True},
+    }
+    inputs = {
+        "truncate": transcript[:1024],
+        "prefilter": filtered,
+    }
+    rows = []
+    for name, options in paths.items():
+        # Warm-up so model load and first-call overhead do not skew the timing
+        summarizer.summarize_text(transcript, **options)
+        started = time.perf_counter()
+        summary = summarizer.summarize_text(transcript, **options)
+        elapsed = time.perf_counter() - started
+
+        target = reference or transcript
+        metric = "f1" if reference else "recall"
+        rows.append((
+            name,
+            len(tokenizer.encode(inputs[name])),
+            elapsed,
+            rouge_n(target, summary, 1)[metric],
+            rouge_n(target, summary, 2)[metric],
+            rouge_l(target, summary)[metric],
+        ))
+        print(f"\n📝 {name}: {summary}")
+
+    metric_name = "F1 vs reference" if reference else "recall vs transcript"
+    print(f"\n📊 Results (ROUGE {metric_name})")
+    print(f"{'path':<10} {'tokens':>7} {'seconds':>8} {'R-1':>6} {'R-2':>6} {'R-L':>6}")
+    for name, tokens, elapsed, r1, r2, rl in rows:
+        print(f"{name:<10} {tokens:>7} {elapsed:>8.2f} {r1:>6.3f} {r2:>6.3f} {rl:>6.3f}")
+
+
+if __name__ == "__main__":
+    bench_summarization()
@@ -0,0 +1,110 @@
+"""
+Benchmark script comparing Whisper transcription profiles on one recording
+
+Usage:
+    python bench_transcription.py <audio-or-video> [reference.txt] [--model base] [--window 120]
+
+Decodes through transcribe_windows, the windowed path the server uses, with
+each profile's time budget. Reports wall time, real-time factor, windows
+decoded with the degraded profile and, when a reference transcript is given,
+word error rate for every profile. Without a reference, the "accurate"
+profile's output is used as the reference.
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import subprocess
+
+from transcription_profiles import TRANSCRIPTION_PROFILES, DEGRADED_PROFILE, decode_options, time_budget
+from streaming_transcriber import transcribe_windows, stream_pcm_windows, read_segments, DEFAULT_WINDOW_SECONDS
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level Levenshtein distance divided by reference length"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def media_duration(path: str) -> float:
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True,
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return 0.0
+
+
+def bench_transcription():
+    parser = argparse.ArgumentParser(description="Compare Whisper transcription profiles")
+    parser.add_argument("media", help="Audio or video file to transcribe")
+    parser.add_argument("reference", nargs="?", help="Reference transcript (plain text)")
+    parser.add_argument("--model", default="base", help="Whisper model size")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW_SECONDS, help="Window length in seconds")
+    args = parser.parse_args()
+
+    try:
+        import whisper
+    except ImportError:
+        print("❌ openai-whisper is not installed")
+        return
+
+    duration = media_duration(args.media)
+    print(f"🎧 {args.media} ({duration:.1f}s)")
+    print(f"📦 Loading Whisper '{args.model}' model...")
+    model = whisper.load_model(args.model)
+
+    reference = None
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = f.read()
+
+    # Run the accurate profile first so it can serve as the reference
+    order = sorted(TRANSCRIPTION_PROFILES, key=lambda name: name != "accurate")
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in order:
+            print(f"\n⏱️  Profile '{name}'...")
+            segments_path = os.path.join(scratch, f"{name}.segments.jsonl")
+            started = time.perf_counter()
+            stats = transcribe_windows(
+                model,
+                stream_pcm_windows(args.media, args.window),
+                segments_path,
+                time_budget=time_budget(name),
+                degraded_options=decode_options(DEGRADED_PROFILE),
+                **decode_options(name),
+            )
+            elapsed = time.perf_counter() - started
+            text = " ".join(segment["text"] for segment in read_segments(segments_path))
+            results[name] = (elapsed, text, stats["degraded_windows"])
+            print(f"  ✅ {elapsed:.1f}s")
+            if reference is None and name == "accurate":
+                reference = text
+
+    print("\n📊 Results")
+    print(f"{'profile':<10} {'seconds':>8} {'RTF':>6} {'degraded':>9} {'WER':>7}")
+    for name in TRANSCRIPTION_PROFILES:
+        elapsed, text, degraded = results[name]
+        rtf = elapsed / duration if duration else 0.0
+        print(f"{name:<10} {elapsed:>8.1f} {rtf:>6.2f} {degraded:>9} {word_error_rate(reference, text):>7.1%}")
+
+
+if __name__ == "__main__":
+    bench_transcription()
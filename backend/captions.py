@@ -0,0 +1,197 @@
+"""
+Subtitle generation (SRT/WebVTT) from Whisper segments with compact array-backed storage
+"""
+
+import logging
+from array import array
+from pathlib import Path
+from typing import Optional, List, Dict, Any
+
+from translator import translate_text
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_BATCH_CHARS = 4500   # Stay under the 5000 character Google Translate limit
+CUE_SEPARATOR = "\n"
+
+
+class CaptionTrack:
+    """
+    Caption cues stored column-wise: timings in float arrays, text in one list
+
+    Word timestamps, when present, are stored the same way with per-cue offsets
+    into the word arrays, and rendered as WebVTT inline timestamps.
+    """
+
+    def __init__(self):
+        self.starts = array("d")
+        self.ends = array("d")
+        self.texts: List[str] = []
+        self.word_offsets = array("I", [0])
+        self.word_starts = array("d")
+        self.word_ends = array("d")
+        self.words: List[str] = []
+
+    @classmethod
+    def from_segments(cls, segments: List[Dict[str, Any]]) -> "CaptionTrack":
+        """Build a track from Whisper-style segments (optionally carrying "words")"""
+        track = cls()
+        for segment in segments:
+            text = segment["text"].strip()
+            if not text:
+                continue
+            track.starts.append(float(segment["start"]))
+            track.ends.append(float(segment["end"]))
+            track.texts.append(text)
+            for word in segment.get("words") or []:
+                track.word_starts.append(float(word["start"]))
+                track.word_ends.append(float(word["end"]))
+                track.words.append(word["word"].strip())
+            track.word_offsets.append(len(track.words))
+        return track
+
+    def with_texts(self, texts: List[str]) -> "CaptionTrack":
+        """Return a track sharing these timings with replaced cue text (e.g. a translation)"""
+        track = CaptionTrack()
+        track.starts, track.ends = self.starts, self.ends
+        track.texts = texts
+        track.word_offsets = array("I", [0] * (len(texts) + 1))
+        return track
+
+    def timed_text(self, index: int) -> str:
+        """Cue text with a WebVTT timestamp tag before each word after the first
+
+        Tags must fall strictly inside the cue and increase, so out-of-order
+        word times are left untagged. Cues without word timestamps keep their text.
+        """
+        begin, end = self.word_offsets[index], self.word_offsets[index + 1]
+        if begin == end:
+            return self.texts[index]
+        parts = [self.words[begin]]
+        last = self.starts[index]
+        for i in range(begin + 1, end):
+            start = self.word_starts[i]
+            if last < start < self.ends[index]:
+                parts.append(f"<{_timestamp(start, '.')}>{self.words[i]}")
+                last = start
+            else:
+                parts.append(self.words[i])
+        return " ".join(parts)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def to_srt(self) -> str:
+        """Render the track as SubRip"""
+        blocks = []
+        for i, text in enumerate(self.texts):
+            blocks.append(
+                f"{i + 1}\n{_timestamp(self.starts[i], ',')} --> {_timestamp(self.ends[i], ',')}\n{text}\n"
+            )
+        return "\n".join(blocks)
+
+    def to_vtt(self) -> str:
+        """Render the track as WebVTT, with per-word timestamps where known"""
+        blocks = ["WEBVTT\n"]
+        for i in range(len(self.texts)):
+            blocks.append(f"{_timestamp(self.starts[i], '.')} --> {_timestamp(self.ends[i], '.')}\n{self.timed_text(i)}\n")
+        return "\n".join(blocks)
+
+
+def _timestamp(seconds: float, separator: str) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def _is_translation_error(text: str) -> bool:
+    return not text or text.startswith(("Translation error:", "Text too short", "Translation produced no output"))
+
+
+def translate_track(track: CaptionTrack, target_lang: str) -> Optional[CaptionTrack]:
+    """
+    Translate a track cue-batch by cue-batch, keeping the original timings
+
+    Cues are joined with newlines so each batch is a single translate_text call.
+    If a batch comes back with a different number of lines its cues are translated
+    individually. Returns None as soon as a cue cannot be translated, rather than
+    a track that silently mixes languages.
+    """
+    translated: List[str] = []
+    batch: List[str] = []
+    size = 0
+
+    def flush() -> bool:
+        if not batch:
+            return True
+        result = translate_text(CUE_SEPARATOR.join(batch), target_lang=target_lang)
+        lines = [] if _is_translation_error(result) else result.split(CUE_SEPARATOR)
+        if len(lines) == len(batch):
+            translated.extend(line.strip() for line in lines)
+            return True
+        for text in batch:
+            single = translate_text(text, target_lang=target_lang)
+            if _is_translation_error(single):
+                logger.warning(f"Caption translation to {target_lang} failed: {single}")
+                return False
+            translated.append(single.strip())
+        return True
+
+    for text in track.texts:
+        text = text.replace(CUE_SEPARATOR, " ")
+        if batch and size + len(text) + 1 > TRANSLATION_BATCH_CHARS:
+            if not flush():
+                return None
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text) + 1
+    if not flush():
+        return None
+
+    return track.with_texts(translated)
+
+
+def write_captions(
+    segments: List[Dict[str, Any]],
+    output_dir: str,
+    target_lang: Optional[str] = None,
+) -> Dict[str, str]:
+    """
+    Write source SRT/VTT captions and, optionally, a translated VTT track
+
+    Args:
+        segments: Transcript segments from the transcription stage
+        output_dir: Directory to write caption files into
+        target_lang: Language code for the translated track, if any
+
+    Returns:
+        Mapping of caption kind ("srt", "vtt", "translated_vtt") to file path;
+        "translated_vtt" is missing if any cue could not be translated
+    """
+    track = CaptionTrack.from_segments(segments)
+    if not len(track):
+        return {}
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    files = {
+        "srt": output_dir / "captions.srt",
+        "vtt": output_dir / "captions.vtt",
+    }
+    files["srt"].write_text(track.to_srt(), encoding="utf-8")
+    files["vtt"].write_text(track.to_vtt(), encoding="utf-8")
+
+    translated_path = output_dir / f"captions.{target_lang}.vtt"
+    translated = translate_track(track, target_lang) if target_lang else None
+    if translated is not None:
+        files["translated_vtt"] = translated_path
+        translated_path.write_text(translated.to_vtt(), encoding="utf-8")
+    elif target_lang:
+        # Do not leave a track from an earlier run behind
+        translated_path.unlink(missing_ok=True)
+
+    logger.info(f"✅ Captions written: {len(track)} cues to {output_dir}")
+    return {kind: str(path) for kind, path in files.items()}
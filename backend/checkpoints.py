@@ -0,0 +1,135 @@
+"""
+Per-job pipeline checkpoints so interrupted or partially failed jobs can resume
+"""
+
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Job states recorded in the checkpoint
+RUNNING = "running"
+PARTIAL = "partial"        # Finished, but at least one stage failed and can be retried
+COMPLETED = "completed"
+
+
+class JobCheckpoint:
+    """
+    Stage outputs of one job, persisted to <root>/<job_id>/checkpoint.json
+
+    Every write replaces the file atomically, so a crash mid-write leaves the
+    previous checkpoint intact.
+    """
+
+    def __init__(self, root: str, job_id: str, data: Optional[Dict[str, Any]] = None):
+        self.job_id = job_id
+        self.directory = Path(root) / job_id
+        self.path = self.directory / "checkpoint.json"
+        self.data = data or {"job_id": job_id, "status": RUNNING, "params": {}, "stages": {}}
+        self._lock_fd: Optional[int] = None
+
+    @classmethod
+    def create(cls, root: str, job_id: str, params: Dict[str, Any]) -> "JobCheckpoint":
+        """Start a checkpoint for a new job; params must be enough to rerun the job"""
+        checkpoint = cls(root, job_id)
+        checkpoint.data["params"] = params
+        checkpoint.data["created_at"] = time.time()
+        checkpoint._write()
+        return checkpoint
+
+    @classmethod
+    def load(cls, root: str, job_id: str) -> Optional["JobCheckpoint"]:
+        path = Path(root) / job_id / "checkpoint.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(root, job_id, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def params(self) -> Dict[str, Any]:
+        return self.data["params"]
+
+    @property
+    def status(self) -> str:
+        return self.data["status"]
+
+    def has(self, stage: str) -> bool:
+        return stage in self.data["stages"]
+
+    def get(self, stage: str) -> Dict[str, Any]:
+        return self.data["stages"][stage]
+
+    def save_stage(self, stage: str, outputs: Dict[str, Any], timing: float) -> None:
+        """Record a successfully completed stage"""
+        self.data["stages"][stage] = {"outputs": outputs, "timing": timing, "completed_at": time.time()}
+        self._write()
+        logger.info(f"Checkpointed stage '{stage}' for job {self.job_id}")
+
+    def set_status(self, status: str, **extra) -> None:
+        self.data["status"] = status
+        self.data.update(extra)
+        self._write()
+
+    def claim(self) -> bool:
+        """Take ownership of the job for this process; False if another owner holds it
+
+        Stops several workers from resuming the same job after a restart. The
+        flock is tied to the open file, so the kernel drops it when the owning
+        process exits, however it exits, and a reused PID cannot inherit it.
+        """
+        if self._lock_fd is not None:
+            return True
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / "owner.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        return True
+
+    def release(self) -> None:
+        """Give up ownership; safe to call more than once"""
+        # The lock file stays: unlinking it would let a new owner lock a fresh
+        # file while a waiter still holds the old one open
+        if self._lock_fd is None:
+            return
+        fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+        os.close(self._lock_fd)
+        self._lock_fd = None
+
+    def remove(self) -> None:
+        self.release()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def list_checkpoints(root: str, statuses: Optional[List[str]] = None) -> List[JobCheckpoint]:
+    """Load every checkpoint under root, optionally filtered by status"""
+    root_path = Path(root)
+    if not root_path.exists():
+        return []
+    checkpoints = []
+    for entry in root_path.iterdir():
+        checkpoint = JobCheckpoint.load(root, entry.name)
+        if checkpoint and (statuses is None or checkpoint.status in statuses):
+            checkpoints.append(checkpoint)
+    return checkpoints
@@ -0,0 +1,151 @@
+"""
+Extractive pre-filter for summarization: TextRank over TF-IDF sentence vectors
+
+Ranks transcript sentences by centrality and keeps the best ones up to a
+token budget, so the abstractive model sees the whole lecture's key points
+instead of only its first paragraph.
+"""
+
+import re
+import zlib
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HASH_DIMENSIONS = 4096
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+REDUNDANCY_THRESHOLD = 0.7    # Skip sentences this similar to one already selected
+MIN_SENTENCE_WORDS = 4
+
+# Spoken disfluencies that carry no content ("kind of", "sort of" often do carry meaning)
+FILLER_PATTERN = re.compile(
+    r"\b(?:um+|uh+|erm+|hmm+)\b[,.]?\s*",
+    re.IGNORECASE,
+)
+REPEATED_WORD_PATTERN = re.compile(r"\b(\w+)(?:\s+\1\b)+", re.IGNORECASE)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he i if in is it its of on or "
+    "so that the their there they this to was we were what when which will with you".split()
+)
+
+
+def clean_text(text: str) -> str:
+    """Drop filler words and immediate word repetitions ("the the")"""
+    text = FILLER_PATTERN.sub("", text)
+    text = REPEATED_WORD_PATTERN.sub(r"\1", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentence split on terminal punctuation, dropping fragments too short to carry content"""
+    sentences = [s.strip() for s in SENTENCE_PATTERN.split(text) if s.strip()]
+    return [s for s in sentences if len(s.split()) >= MIN_SENTENCE_WORDS]
+
+
+def _tfidf_vectors(sentences: List[str]) -> np.ndarray:
+    """L2-normalized hashed TF-IDF vectors, one row per sentence"""
+    counts = np.zeros((len(sentences), HASH_DIMENSIONS), dtype=np.float32)
+    for row, sentence in enumerate(sentences):
+        for word in re.findall(r"\w+", sentence.lower()):
+            if word not in STOPWORDS:
+                counts[row, zlib.crc32(word.encode()) % HASH_DIMENSIONS] += 1.0
+
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)).astype(np.float32) + 1.0
+    vectors = np.log1p(counts) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def rank_sentences(sentences: List[str], vectors: Optional[np.ndarray] = None) -> np.ndarray:
+    """TextRank centrality score per sentence (PageRank over cosine similarity)"""
+    count = len(sentences)
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    if vectors is None:
+        vectors = _tfidf_vectors(sentences)
+
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    # Row-stochastic transitions; isolated sentences jump uniformly
+    transition = np.where(out_weight > 0, similarity / np.maximum(out_weight, 1e-9), 1.0 / count)
+
+    scores = np.full(count, 1.0 / count, dtype=np.float32)
+    for _ in range(MAX_ITERATIONS):
+        updated = (1 - DAMPING) / count + DAMPING * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < TOLERANCE:
+            scores = updated
+            break
+        scores = updated
+    return scores
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough subword count when no tokenizer is available"""
+    return int(len(text.split()) * 1.3) + 1
+
+
+def leading_words(text: str, token_budget: int, count_tokens: Callable[[str], int] = estimate_tokens) -> str:
+    """Longest prefix of whole words that fits the token budget"""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle])) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def select_key_sentences(
+    text: str,
+    token_budget: int,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> str:
+    """
+    Keep the most central sentences that fit the token budget, in original order
+
+    Text that already fits the budget is returned unchanged. If no sentence
+    can be selected, the leading words that fit the budget are returned.
+    """
+    if count_tokens(text) <= token_budget:
+        return text
+
+    cleaned = clean_text(text)
+    sentences = split_sentences(cleaned)
+    if not sentences:
+        return leading_words(cleaned, token_budget, count_tokens)
+
+    vectors = _tfidf_vectors(sentences)
+    scores = rank_sentences(sentences, vectors)
+
+    selected: List[int] = []
+    used = 0
+    for index in np.argsort(-scores, kind="stable"):
+        if used >= token_budget:
+            break
+        if selected and (vectors[selected] @ vectors[index]).max() >= REDUNDANCY_THRESHOLD:
+            continue
+        tokens = count_tokens(sentences[index])
+        if used + tokens > token_budget:
+            continue
+        selected.append(int(index))
+        used += tokens
+
+    if not selected:
+        return leading_words(cleaned, token_budget, count_tokens)
+
+    logger.info(
+        f"Extractive pre-filter kept {len(selected)}/{len(sentences)} sentences "
+        f"({used} of {count_tokens(cleaned)} tokens)"
+    )
+    return " ".join(sentences[i] for i in sorted(selected))
@@ -0,0 +1,216 @@
+"""
+In-process stand-ins for every external dependency, for load tests and offline runs
+
+With SNAPSTUDY_FAKE_BACKENDS=1 the app uses these instead of Gemini, Google
+Translate, Whisper, BART and FFmpeg, so it imports and serves uploads with no
+API key, no network, no model weights and no FFmpeg. Remote fakes sleep for a
+log-normally distributed latency and fail at a configurable rate; local fakes
+take time proportional to the media duration.
+
+Configuration (remote fakes take "median seconds,sigma,error rate"):
+    SNAPSTUDY_FAKE_GEMINI          default "0.8,0.4,0.02"
+    SNAPSTUDY_FAKE_TRANSLATE       default "0.15,0.4,0.01"
+    SNAPSTUDY_FAKE_WHISPER_RTF     Seconds of decode per media second, default 0.005
+    SNAPSTUDY_FAKE_SUMMARY_SECONDS default 0.5
+    SNAPSTUDY_FAKE_MEDIA_SECONDS   Duration reported for, and decoded from, every upload, default 600
+"""
+
+import os
+import re
+import json
+import math
+import time
+import wave
+import random
+import logging
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FAKE_BACKENDS = os.getenv("SNAPSTUDY_FAKE_BACKENDS") == "1"
+
+WHISPER_RTF = float(os.getenv("SNAPSTUDY_FAKE_WHISPER_RTF", "0.005"))
+SUMMARY_SECONDS = float(os.getenv("SNAPSTUDY_FAKE_SUMMARY_SECONDS", "0.5"))
+MEDIA_SECONDS = float(os.getenv("SNAPSTUDY_FAKE_MEDIA_SECONDS", "600"))
+SEGMENT_SECONDS = 6.0
+
+LECTURE_SENTENCES = [
+    "Gradient descent updates each parameter against the gradient of the loss.",
+    "The learning rate controls how large each update step is.",
+    "Backpropagation applies the chain rule layer by layer.",
+    "Regularization penalizes large weights to reduce overfitting.",
+    "A validation set estimates how well the model generalizes.",
+    "Batch normalization keeps activations in a stable range during training.",
+    "Convolutional layers share weights across spatial positions.",
+    "Dropout randomly disables units so the network cannot rely on any single one.",
+    "Cross-entropy loss compares predicted probabilities with the true labels.",
+    "Early stopping halts training when validation loss stops improving.",
+]
+
+
+class FakeServiceError(RuntimeError):
+    """Injected failure of a fake remote service"""
+
+
+class LatencyModel:
+    """Log-normal latency around a median plus a fixed failure probability"""
+
+    def __init__(self, median: float, sigma: float, error_rate: float):
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, default: str) -> "LatencyModel":
+        median, sigma, error_rate = (float(part) for part in os.getenv(name, default).split(","))
+        return cls(median, sigma, error_rate)
+
+    def wait(self, service: str) -> None:
+        """Sleep for one sampled latency, then fail with the configured probability"""
+        with self._lock:
+            delay = self.median * math.exp(self.sigma * self._random.gauss(0.0, 1.0))
+            failed = self._random.random() < self.error_rate
+        time.sleep(delay)
+        if failed:
+            raise FakeServiceError(f"{service}: 503 Service Unavailable (injected)")
+
+
+GEMINI_LATENCY = LatencyModel.from_env("SNAPSTUDY_FAKE_GEMINI", "0.8,0.4,0.02")
+TRANSLATE_LATENCY = LatencyModel.from_env("SNAPSTUDY_FAKE_TRANSLATE", "0.15,0.4,0.01")
+
+
+class FakeGeminiModel:
+    """Answers quiz prompts with valid structured JSON, like genai.GenerativeModel"""
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None):
+        GEMINI_LATENCY.wait("gemini")
+        count_match = re.search(r"create (\d+) multiple choice", prompt)
+        content_match = re.search(r"CONTENT:\n(.*?)\n\nREQUIREMENTS:", prompt, re.DOTALL)
+        if not count_match:
+            text = "test"
+        else:
+            count = int(count_match.group(1))
+            content = content_match.group(1) if content_match else ""
+            sentences = [s for s in re.split(r"(?<=[.!?])\s+", content) if s.strip()] or LECTURE_SENTENCES
+            text = json.dumps([self._question(sentences[i % len(sentences)], i) for i in range(count)])
+
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=len(prompt) // 4,
+                candidates_token_count=len(text) // 4,
+            ),
+        )
+
+    @staticmethod
+    def _question(sentence: str, index: int) -> Dict[str, Any]:
+        return {
+            "question": f"Question {index + 1}: which statement matches the lecture? ({sentence[:60]})",
+            "options": [sentence, f"The opposite of: {sentence}", "None of the above", f"Unrelated claim {index}"],
+            "answer": "A",
+            "source": sentence,
+        }
+
+
+class FakeTranslator:
+    """Drop-in for deep_translator.GoogleTranslator"""
+
+    def __init__(self, source: str = "auto", target: str = "en"):
+        self.source = source
+        self.target = target
+
+    def translate(self, text: str) -> str:
+        TRANSLATE_LATENCY.wait("translate")
+        return f"[{self.target}] {text}"
+
+
+class FakeWhisperModel:
+    """Returns a synthetic lecture transcript after a delay proportional to its length"""
+
+    def transcribe(self, audio, **kwargs) -> Dict[str, Any]:
+        duration = len(audio) / 16000 if not isinstance(audio, str) else MEDIA_SECONDS
+        time.sleep(duration * WHISPER_RTF)
+        segments = []
+        for index in range(max(1, int(duration // SEGMENT_SECONDS))):
+            start = index * SEGMENT_SECONDS
+            segments.append({
+                "start": start,
+                "end": start + SEGMENT_SECONDS,
+                "text": " " + LECTURE_SENTENCES[index % len(LECTURE_SENTENCES)],
+                "words": [],
+            })
+        return {"text": "".join(segment["text"] for segment in segments).strip(), "segments": segments}
+
+
+class FakeTokenizer:
+    model_max_length = 1024
+
+    def encode(self, text: str, add_special_tokens: bool = True) -> List[int]:
+        return list(range(int(len(text.split()) * 1.3)))
+
+
+class FakeSummarizer:
+    """Callable like a transformers summarization pipeline"""
+
+    tokenizer = FakeTokenizer()
+
+    def __call__(self, text: str, **kwargs) -> List[Dict[str, str]]:
+        time.sleep(SUMMARY_SECONDS)
+        sentences = re.split(r"(?<=[.!?])\s+", text.strip())
+        return [{"summary_text": " ".join(sentences[:4])}]
+
+
+def fake_probe_media(path: str) -> Optional[Dict[str, Any]]:
+    """probe_media() result for any upload, with the configured duration"""
+    if not os.path.exists(path):
+        return None
+    return {
+        "duration": MEDIA_SECONDS,
+        "format": "mov,mp4,m4a,3gp,3g2,mj2",
+        "bit_rate": 1_000_000,
+        "size": os.path.getsize(path),
+        "has_video": True,
+        "video_codec": "h264",
+        "width": 1280,
+        "height": 720,
+        "has_audio": True,
+        "audio_codec": "aac",
+        "sample_rate": 44100,
+        "channels": 2,
+    }
+
+
+def fake_extract_audio(video_path: str, audio_only: bool = False) -> Optional[str]:
+    """Write one second of 16 kHz silence where extract_audio would put the WAV (see fake_pcm_windows)"""
+    audio_path = Path(video_path).with_suffix(".wav")
+    with wave.open(str(audio_path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b"\x00\x00" * 16000)
+    return str(audio_path)
+
+
+def fake_pcm_windows(media_path: str, window_seconds: int = 120) -> Iterator[Tuple[float, np.ndarray]]:
+    """Silent windows covering the configured media duration, like stream_pcm_windows and wav_windows
+
+    The WAV from fake_extract_audio is only a placeholder, so the fake model is fed
+    full-length audio from here and its decode time follows SNAPSTUDY_FAKE_WHISPER_RTF.
+    """
+    window = np.zeros(window_seconds * 16000, dtype=np.float32)
+    offset = 0.0
+    while offset < MEDIA_SECONDS:
+        seconds = min(window_seconds, MEDIA_SECONDS - offset)
+        yield offset, window[:int(seconds * 16000)]
+        offset += seconds
+
+
+def fake_clip_key_segments(video_path: str, max_clips: int = 1, threads: Optional[int] = None) -> List[str]:
+    return []
@@ -0,0 +1,170 @@
+"""
+Audio fingerprints for spotting re-encoded or trimmed copies of the same recording
+
+Spectral peaks of the 16 kHz WAV are paired into (frequency, frequency, time
+delta) hashes. Hashes survive re-encoding, and since each one is stored with
+its frame offset, a trimmed copy still matches at a constant offset.
+"""
+
+import wave
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FFT_SIZE = 1024
+HOP = 512
+FRAME_SECONDS = HOP / SAMPLE_RATE
+BAND_EDGES = (10, 20, 40, 80, 120, 180, 256)   # FFT bins, ~150 Hz to 4 kHz
+PEAK_NEIGHBORHOOD = 5       # A peak must be the loudest in its band for +/- this many frames
+PEAK_PROMINENCE = 1.0      # Log-magnitude a peak must exceed its band median by
+FAN_OUT = 4                 # Later peaks paired with each anchor peak
+MAX_DELTA_FRAMES = 63
+CHUNK_FRAMES = 4096         # Frames decoded per read; bounds memory on long recordings
+
+# Matching
+MIN_ALIGNED_HASHES = 25     # Hashes agreeing on one offset needed to call a match
+RANGE_SECONDS = 5           # Granularity of matched / mismatched time ranges
+MIN_RANGE_HASHES = 5        # Ranges with fewer hashes (near silence) count as matched
+MATCH_RANGE_RATIO = 0.5     # A range matches if its aligned share is at least this
+                            # fraction of the aligned share across the whole recording
+RANGE_PADDING = 2.5         # Seconds added on both sides; edits rarely fall on range borders
+
+
+def _band_maxima(wav_path: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Per-frame loudest bin and its log-magnitude in each band, read chunk by chunk"""
+    with wave.open(wav_path, "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getsampwidth() != 2:
+            logger.warning(f"Cannot fingerprint {wav_path}: expected 16 kHz 16-bit PCM")
+            return None
+        channels = wav.getnchannels()
+        window = np.hanning(FFT_SIZE).astype(np.float32)
+        tail = np.zeros(0, dtype=np.float32)
+        magnitudes, bins = [], []
+
+        while True:
+            raw = wav.readframes(CHUNK_FRAMES * HOP)
+            if not raw:
+                break
+            samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+            if channels > 1:
+                samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+            samples = np.concatenate([tail, samples])
+            if len(samples) < FFT_SIZE:
+                tail = samples
+                continue
+
+            frames = sliding_window_view(samples, FFT_SIZE)[::HOP]
+            tail = samples[len(frames) * HOP:]
+            spectrum = np.log1p(np.abs(np.fft.rfft(frames * window, axis=1)))
+
+            rows = np.arange(len(frames))
+            chunk_bins = np.empty((len(frames), len(BAND_EDGES) - 1), dtype=np.int32)
+            chunk_magnitudes = np.empty_like(chunk_bins, dtype=np.float32)
+            for band, (low, high) in enumerate(zip(BAND_EDGES, BAND_EDGES[1:])):
+                peak = spectrum[:, low:high].argmax(axis=1)
+                chunk_bins[:, band] = peak + low
+                chunk_magnitudes[:, band] = spectrum[rows, peak + low]
+            bins.append(chunk_bins)
+            magnitudes.append(chunk_magnitudes)
+
+    if not bins:
+        return None
+    return np.concatenate(magnitudes), np.concatenate(bins)
+
+
+def compute_fingerprint(wav_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Fingerprint a 16 kHz WAV
+
+    Returns:
+        Dict with ``hashes`` and ``offsets`` (anchor frame) arrays and the
+        ``duration`` in seconds, or None if the file cannot be fingerprinted
+    """
+    try:
+        maxima = _band_maxima(wav_path)
+    except (OSError, wave.Error) as e:
+        logger.warning(f"Cannot fingerprint {wav_path}: {e}")
+        return None
+    if maxima is None:
+        return None
+    magnitudes, bins = maxima
+
+    # Keep band maxima that are also the loudest within the surrounding frames
+    padded = np.pad(magnitudes, ((PEAK_NEIGHBORHOOD, PEAK_NEIGHBORHOOD), (0, 0)), constant_values=-np.inf)
+    local_max = sliding_window_view(padded, 2 * PEAK_NEIGHBORHOOD + 1, axis=0).max(axis=-1)
+    threshold = np.median(magnitudes, axis=0) + PEAK_PROMINENCE
+    frame_index, band_index = np.nonzero((magnitudes >= local_max) & (magnitudes > threshold))
+    peak_bins = bins[frame_index, band_index]
+
+    # Pair each anchor with the next FAN_OUT peaks (peaks are ordered by frame)
+    hashes, offsets = [], []
+    for step in range(1, FAN_OUT + 1):
+        anchor_frames, target_frames = frame_index[:-step], frame_index[step:]
+        delta = target_frames - anchor_frames
+        valid = delta <= MAX_DELTA_FRAMES
+        hashes.append(
+            (peak_bins[:-step][valid].astype(np.int64) << 14)
+            | (peak_bins[step:][valid].astype(np.int64) << 6)
+            | delta[valid]
+        )
+        offsets.append(anchor_frames[valid])
+
+    fingerprint = {
+        "hashes": np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.int64),
+        "offsets": np.concatenate(offsets).astype(np.int64) if offsets else np.zeros(0, dtype=np.int64),
+        "duration": round(len(magnitudes) * FRAME_SECONDS, 2),
+    }
+    logger.info(
+        f"Fingerprinted {wav_path}: {len(fingerprint['hashes'])} hashes over {fingerprint['duration']:.0f}s"
+    )
+    return fingerprint
+
+
+def mismatched_ranges(
+    query_offsets: np.ndarray,
+    matched_offsets: np.ndarray,
+    duration: float,
+) -> List[Tuple[float, float]]:
+    """
+    Time ranges (seconds) of the query whose hashes did not align with the match
+
+    Args:
+        query_offsets: Anchor frame of every query hash
+        matched_offsets: Anchor frame of every query hash that aligned
+        duration: Query duration in seconds
+    """
+    range_frames = int(RANGE_SECONDS / FRAME_SECONDS)
+    count = int(np.ceil(duration / RANGE_SECONDS)) or 1
+    total = np.bincount(query_offsets // range_frames, minlength=count)[:count]
+    matched = np.bincount(matched_offsets // range_frames, minlength=count)[:count]
+    overall = len(matched_offsets) / max(len(query_offsets), 1)
+    mismatched = (total >= MIN_RANGE_HASHES) & (matched < MATCH_RANGE_RATIO * overall * total)
+
+    ranges: List[Tuple[float, float]] = []
+    for index in np.flatnonzero(mismatched):
+        start = max(0.0, float(index * RANGE_SECONDS) - RANGE_PADDING)
+        end = min(float((index + 1) * RANGE_SECONDS) + RANGE_PADDING, duration)
+        if ranges and ranges[-1][1] >= start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def read_wav_range(wav_path: str, start: float, end: float) -> np.ndarray:
+    """Mono float32 samples between start and end seconds, as Whisper expects"""
+    with wave.open(wav_path, "rb") as wav:
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        first = max(0, int(start * rate))
+        wav.setpos(min(first, wav.getnframes()))
+        raw = wav.readframes(max(0, int(end * rate) - first))
+    samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
@@ -0,0 +1,254 @@
+"""
+Gemini call wrapper with response caching, model probe caching and token accounting
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator, Callable, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", "3600"))              # Seconds a cached response stays valid
+CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "256"))             # Maximum cached responses
+PROBE_CACHE_PATH = os.getenv("GEMINI_PROBE_CACHE", ".gemini_probe.json")
+PROBE_TTL = int(os.getenv("GEMINI_PROBE_TTL", str(24 * 3600)))      # Seconds a model probe result is trusted
+
+# google.api_core errors meaning the model itself is unusable with this key (retired, no access,
+# bad key); matched by name so fake backends need not import the SDK
+MODEL_UNAVAILABLE_ERRORS = ("NotFound", "PermissionDenied", "Unauthenticated")
+
+# Usage records for the job running in the current context (see track_usage)
+_current_usage: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "gemini_usage", default=None
+)
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with per-entry TTL"""
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: int = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def cache_key(model_name: str, prompt: str, generation_config: Optional[Dict[str, Any]]) -> str:
+    """Key a response by model, prompt hash and generation config"""
+    payload = json.dumps(
+        {"model": model_name, "config": generation_config or {}},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode() + b"\0" + prompt.encode()).hexdigest()
+
+
+def model_unavailable(error: Exception) -> bool:
+    """True when a call failed because the model cannot be used, not because of load or input"""
+    return type(error).__name__ in MODEL_UNAVAILABLE_ERRORS or "API_KEY_INVALID" in str(error)
+
+
+class GeminiClient:
+    """Wraps a GenerativeModel with caching and usage accounting
+
+    With reprobe, a call that fails because the model is unavailable drops the
+    probe cache, switches to the model reprobe() returns and is retried once.
+    """
+
+    def __init__(
+        self,
+        model,
+        model_name: str,
+        cache: Optional[ResponseCache] = None,
+        reprobe: Optional[Callable[[], Tuple[Any, Optional[str]]]] = None,
+    ):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache if cache is not None else ResponseCache()
+        self.reprobe = reprobe
+        self._lock = threading.Lock()
+        self._reprobe_lock = threading.Lock()
+        self.totals = {"calls": 0, "cache_hits": 0, "input_tokens": 0, "output_tokens": 0, "latency": 0.0}
+
+    def generate(
+        self,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Generate text for a prompt, serving identical requests from the cache
+
+        Args:
+            prompt: Prompt text
+            generation_config: Optional generation config dict passed to Gemini
+            use_cache: Set False when a fresh answer is required (e.g. regenerating invalid output)
+
+        Returns:
+            Response text (empty string if the model returned none)
+        """
+        key = cache_key(self.model_name, prompt, generation_config)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._record(0, 0, 0.0, cached=True)
+                return cached
+
+        model, model_name = self.model, self.model_name
+        started = time.perf_counter()
+        try:
+            response = model.generate_content(prompt, generation_config=generation_config)
+        except Exception as e:
+            if not (self.reprobe and model_unavailable(e) and self._switch_model(model_name, e)):
+                raise
+            key = cache_key(self.model_name, prompt, generation_config)
+            started = time.perf_counter()
+            response = self.model.generate_content(prompt, generation_config=generation_config)
+        latency = time.perf_counter() - started
+
+        usage = getattr(response, "usage_metadata", None)
+        self._record(
+            getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0,
+            latency,
+        )
+
+        text = (getattr(response, "text", "") or "").strip()
+        if text:
+            self.cache.put(key, text)
+        return text
+
+    def _switch_model(self, failed_name: str, error: Exception) -> bool:
+        """Re-probe after failed_name became unusable; False if no model works"""
+        with self._reprobe_lock:
+            if self.model_name != failed_name:
+                # Another thread already switched
+                return True
+            logger.warning(f"Gemini model {failed_name} unavailable ({error}); re-probing")
+            clear_probe_cache()
+            model, model_name = self.reprobe()
+            if not model or model_name == failed_name:
+                return False
+            self.model, self.model_name = model, model_name
+            return True
+
+    def _record(self, input_tokens: int, output_tokens: int, latency: float, cached: bool = False) -> None:
+        record = {
+            "model": self.model_name,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency": round(latency, 3),
+            "cached": cached,
+        }
+        with self._lock:
+            self.totals["calls"] += 1
+            self.totals["cache_hits"] += int(cached)
+            self.totals["input_tokens"] += input_tokens
+            self.totals["output_tokens"] += output_tokens
+            self.totals["latency"] = round(self.totals["latency"] + latency, 3)
+
+        records = _current_usage.get()
+        if records is not None:
+            with self._lock:
+                records.append(record)
+        logger.debug(f"Gemini call: {record}")
+
+
+@contextmanager
+def track_usage() -> Iterator[List[Dict[str, Any]]]:
+    """
+    Collect usage records for every Gemini call made in this context
+
+    Worker threads must run under contextvars.copy_context() to be included.
+    """
+    records: List[Dict[str, Any]] = []
+    token = _current_usage.set(records)
+    try:
+        yield records
+    finally:
+        _current_usage.reset(token)
+
+
+def summarize_usage(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate usage records into per-job totals"""
+    return {
+        "calls": len(records),
+        "cache_hits": sum(record["cached"] for record in records),
+        "input_tokens": sum(record["input_tokens"] for record in records),
+        "output_tokens": sum(record["output_tokens"] for record in records),
+        "latency": round(sum(record["latency"] for record in records), 3),
+    }
+
+
+def _key_id(api_key: str) -> str:
+    """Probe results are only valid for the key they were made with; store a hash, not the key"""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def load_probe_cache(candidates: List[str], api_key: str) -> Optional[str]:
+    """Return the cached working model name if the probe result is still fresh and for this key"""
+    try:
+        with open(PROBE_CACHE_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if time.time() - data.get("checked_at", 0) > PROBE_TTL:
+        return None
+    if data.get("key_id") != _key_id(api_key):
+        return None
+    if data.get("model_name") not in candidates:
+        return None
+    return data["model_name"]
+
+
+def save_probe_cache(model_name: str, api_key: str) -> None:
+    """Persist the working model name so other workers can skip the live probe"""
+    try:
+        tmp_path = f"{PROBE_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model_name": model_name, "key_id": _key_id(api_key), "checked_at": time.time()}, f)
+        os.replace(tmp_path, PROBE_CACHE_PATH)
+    except OSError as e:
+        logger.warning(f"Failed to write Gemini probe cache: {e}")
+
+
+def clear_probe_cache() -> None:
+    """Forget the probe result, e.g. after the cached model stopped working"""
+    try:
+        os.remove(PROBE_CACHE_PATH)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Failed to remove Gemini probe cache: {e}")
@@ -0,0 +1,176 @@
+"""
+Load generator for the /upload path
+
+Usage:
+    python loadtest.py [--requests 40] [--concurrency 8] [--tenants 4] [--url http://host:port]
+
+Without --url the app is started in-process with SNAPSTUDY_FAKE_BACKENDS=1
+and a throwaway media directory and database, so the run needs no network,
+API key, models or FFmpeg. Tune the fakes with the SNAPSTUDY_FAKE_* variables
+described in fake_backends.py.
+
+Reports throughput, p50/p95/p99 latency, HTTP errors and degraded results
+(finished with a failed remote stage).
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import tempfile
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+DEGRADED_PREFIXES = ("Translation error", "Cannot translate", "Quiz generation")
+
+
+def _payload(size_kb: int, unique: bool) -> bytes:
+    """Upload body; unique bodies defeat the content-hash result cache"""
+    marker = uuid.uuid4().bytes if unique else b"snapstudy-loadtest"
+    return (marker * (size_kb * 1024 // len(marker) + 1))[:size_kb * 1024]
+
+
+def _multipart(fields: Dict[str, str], filename: str, content: bytes) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: video/mp4\r\n\r\n".encode() + content + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class HttpTarget:
+    """Sends uploads to a running server"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    def upload(self, fields: Dict[str, str], filename: str, content: bytes, headers: Dict[str, str]):
+        body, content_type = _multipart(fields, filename, content)
+        req = urllib.request.Request(
+            f"{self.url}/upload", data=body, method="POST",
+            headers={"Content-Type": content_type, **headers},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=3600) as response:
+                return response.status, json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+
+    def health(self) -> Dict[str, Any]:
+        with urllib.request.urlopen(f"{self.url}/health", timeout=30) as response:
+            return json.loads(response.read())
+
+
+class InProcessTarget:
+    """Runs the app inside this process on fake backends"""
+
+    def __init__(self):
+        workdir = tempfile.mkdtemp(prefix="snapstudy-load-")
+        os.environ["SNAPSTUDY_FAKE_BACKENDS"] = "1"
+        os.environ.setdefault("SNAPSTUDY_MEDIA_DIR", os.path.join(workdir, "media"))
+        os.environ.setdefault("SNAPSTUDY_DB_PATH", os.path.join(workdir, "snapstudy.db"))
+        os.environ.setdefault("SNAPSTUDY_RESUME_ON_START", "0")
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        print(f"🧪 Starting app in-process on fake backends ({workdir})")
+        import app
+        self.app = app.app
+        self._local = threading.local()
+
+    def _client(self):
+        # One test client per thread; the WSGI app itself is shared
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        return client
+
+    def upload(self, fields: Dict[str, str], filename: str, content: bytes, headers: Dict[str, str]):
+        from io import BytesIO
+        response = self._client().post(
+            "/upload", data={**fields, "file": (BytesIO(content), filename)},
+            content_type="multipart/form-data", headers=headers,
+        )
+        return response.status_code, response.get_json(silent=True) or {}
+
+    def health(self) -> Dict[str, Any]:
+        return self._client().get("/health").get_json()
+
+
+def run_load(target, requests: int, concurrency: int, tenants: int, size_kb: int, unique: bool) -> None:
+    latencies = np.zeros(requests)
+    statuses: Dict[int, int] = {}
+    degraded = 0
+    lock = threading.Lock()
+
+    def one(index: int) -> None:
+        nonlocal degraded
+        headers = {"X-API-Key": f"loadtest-tenant-{index % tenants}"}
+        started = time.perf_counter()
+        status, body = target.upload(
+            {"target_lang": "hi"}, f"lecture_{index}.mp4", _payload(size_kb, unique), headers
+        )
+        latencies[index] = time.perf_counter() - started
+        failed_stage = status == 200 and (
+            not body.get("quiz_items")
+            or str(body.get("translated_summary", "")).startswith(DEGRADED_PREFIXES)
+        )
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            degraded += int(failed_stage)
+
+    print(f"🚀 {requests} upload(s), {concurrency} concurrent, {tenants} tenant(s)")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(count for status, count in statuses.items() if status >= 400)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print("\n📊 Results")
+    print(f"  Wall time:      {elapsed:.1f}s")
+    print(f"  Throughput:     {requests / elapsed:.2f} uploads/s")
+    print(f"  Latency p50:    {p50:.2f}s")
+    print(f"  Latency p95:    {p95:.2f}s")
+    print(f"  Latency p99:    {p99:.2f}s")
+    print(f"  Latency max:    {latencies.max():.2f}s")
+    print(f"  HTTP errors:    {errors} ({errors / requests:.1%})")
+    print(f"  Degraded (200): {degraded} ({degraded / requests:.1%})")
+    print(f"  Status codes:   {dict(sorted(statuses.items()))}")
+
+    health = target.health()
+    print(f"  Scheduler:      {health.get('scheduler')}")
+    resources = health.get("resources") or {}
+    if resources:
+        print(f"  CPU:            {resources.get('cpu_utilization')} utilization over {resources.get('cores')} core(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent uploads and report latency")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--size-kb", type=int, default=256, help="Upload size")
+    parser.add_argument("--repeat-content", action="store_true", help="Send identical bodies (exercises the result cache)")
+    parser.add_argument("--url", help="Target a running server instead of an in-process app on fake backends")
+    args = parser.parse_args()
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget()
+    run_load(
+        target, args.requests, max(1, args.concurrency), max(1, args.tenants),
+        args.size_kb, unique=not args.repeat_content,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Opt-in per-job profiling: a low-overhead sampling profiler for the pipeline thread
+plus torch operator profiling around the model stages
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Iterator
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = float(os.getenv("SNAPSTUDY_PROFILE_INTERVAL", "0.005"))  # Seconds between samples
+MAX_STACK_DEPTH = 128
+
+# Output file names inside a job's profile directory
+COLLAPSED_FILE = "profile.collapsed"
+SPEEDSCOPE_FILE = "profile.speedscope.json"
+TORCH_TRACE_FILE = "torch_{stage}.trace.json"
+TORCH_TABLE_FILE = "torch_{stage}.txt"
+
+# torch.profiler is process-global: only one job's model stage may hold it at a time
+_torch_profiler_lock = threading.Lock()
+
+# Directory for torch traces of the job running in this context (None = disabled)
+_torch_profile_dir: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "torch_profile_dir", default=None
+)
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack at a fixed interval from a helper thread
+
+    Only the target thread's frame is walked on each tick, so overhead stays
+    small regardless of how much work the profiled code does.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.duration = 0.0
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="snapstudy-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            del frame
+            self.samples[tuple(reversed(stack))] += 1
+
+    def to_collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format, ready for flamegraph.pl or speedscope"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.samples.most_common())
+
+    def to_speedscope(self, name: str) -> Dict:
+        """Speedscope "sampled" profile document"""
+        frame_index: Dict[str, int] = {}
+        frames, samples, weights = [], [], []
+        for stack, count in self.samples.items():
+            indices = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame})
+                indices.append(frame_index[frame])
+            samples.append(indices)
+            weights.append(round(count * self.interval, 6))
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "snapstudy",
+        }
+
+
+@contextmanager
+def profile_job(job_id: str, output_dir: str, torch_ops: bool = False) -> Iterator[None]:
+    """
+    Profile the current thread for the duration of the block
+
+    Writes collapsed-stack and speedscope files to output_dir. With torch_ops,
+    model stages wrapped in torch_stage() also export operator-level traces.
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    profiler = SamplingProfiler(threading.get_ident())
+    token = _torch_profile_dir.set(str(output) if torch_ops else None)
+    profiler.start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        _torch_profile_dir.reset(token)
+        (output / COLLAPSED_FILE).write_text(profiler.to_collapsed(), encoding="utf-8")
+        with open(output / SPEEDSCOPE_FILE, "w", encoding="utf-8") as f:
+            json.dump(profiler.to_speedscope(f"job {job_id}"), f)
+        logger.info(
+            f"Profile for job {job_id}: {sum(profiler.samples.values())} samples over "
+            f"{profiler.duration:.1f}s written to {output}"
+        )
+
+
+@contextmanager
+def torch_stage(stage: str) -> Iterator[None]:
+    """Record torch operator timings for a model stage when the job asked for them
+
+    If another job is already being torch-profiled, the stage runs unprofiled
+    rather than waiting for it or failing.
+    """
+    output_dir = _torch_profile_dir.get()
+    if not output_dir:
+        yield
+        return
+
+    if not _torch_profiler_lock.acquire(blocking=False):
+        logger.warning(f"Torch profiler busy with another job; running {stage} without operator profiling")
+        yield
+        return
+    try:
+        with _torch_profiling(stage, output_dir):
+            yield
+    finally:
+        _torch_profiler_lock.release()
+
+
+@contextmanager
+def _torch_profiling(stage: str, output_dir: str) -> Iterator[None]:
+    """Run the block under torch.profiler and export its trace and operator table"""
+    try:
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+    except ImportError:
+        yield
+        return
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+
+    with profile(activities=activities) as prof:
+        yield
+    try:
+        prof.export_chrome_trace(str(Path(output_dir) / TORCH_TRACE_FILE.format(stage=stage)))
+        table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=40)
+        (Path(output_dir) / TORCH_TABLE_FILE.format(stage=stage)).write_text(table, encoding="utf-8")
+    except Exception as e:
+        logger.warning(f"Failed to export torch profile for {stage}: {e}")
+
+
+def profile_files(output_dir: str) -> Dict[str, str]:
+    """Available profile downloads for a job, keyed by format name"""
+    output = Path(output_dir)
+    files = {
+        "collapsed": output / COLLAPSED_FILE,
+        "speedscope": output / SPEEDSCOPE_FILE,
+    }
+    for trace in sorted(output.glob("torch_*.trace.json")):
+        files[trace.name[len("torch_"):-len(".trace.json")] + "_torch"] = trace
+    return {name: str(path) for name, path in files.items() if path.exists()}
@@ -3,9 +3,21 @@ Production-grade quiz generation using current Gemini AI models
 """
 
 import os
+import re
+import json
+import math
+import zlib
 import logging
-import google.generativeai as genai
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple
+import numpy as np
 from dotenv import load_dotenv
+from gemini_client import GeminiClient, load_probe_cache, save_probe_cache
+from fake_backends import FAKE_BACKENDS, FakeGeminiModel
+
+if not FAKE_BACKENDS:
+    import google.generativeai as genai
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +27,10 @@ load_dotenv()
 # Configure Gemini API
 def initialize_gemini():
     """Initialize Gemini API with current working models"""
+    if FAKE_BACKENDS:
+        logger.info("✅ Using in-process fake Gemini model")
+        return FakeGeminiModel(), "fake-gemini"
+    
     try:
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
@@ -33,6 +49,12 @@ def initialize_gemini():
             "models/gemini-2.0-flash",    # Stable 2.0 version
         ]
         
+        # Skip the live probe if a recent one already found a working model
+        cached_name = load_probe_cache(model_names, api_key)
+        if cached_name:
+            logger.info(f"✅ Gemini API initialized with cached probe result: {cached_name}")
+            return genai.GenerativeModel(cached_name), cached_name
+        
         for model_name in model_names:
             try:
                 model = genai.GenerativeModel(model_name)
@@ -40,6 +62,7 @@ def initialize_gemini():
                 test_response = model.generate_content("Say 'test' in one word.")
                 if test_response and hasattr(test_response, 'text'):
                     logger.info(f"✅ Gemini API initialized successfully with model: {model_name}")
+                    save_probe_cache(model_name, api_key)
                     return model, model_name
             except Exception as e:
                 logger.warning(f"❌ Failed to initialize {model_name}: {e}")
@@ -52,61 +75,404 @@ def initialize_gemini():
         logger.error(f"❌ Gemini initialization failed: {e}")
         return None, None
 
+def _reprobe_gemini():
+    """Probe the candidate models again after the current one stopped working"""
+    global model, model_name
+    replacement, replacement_name = initialize_gemini()
+    if replacement:
+        model, model_name = replacement, replacement_name
+    return replacement, replacement_name
+
 # Initialize at module level
 model, model_name = initialize_gemini()
+client = GeminiClient(model, model_name, reprobe=_reprobe_gemini) if model else None
 
-def generate_quiz(summary: str) -> str:
+OPTION_LETTERS = "ABCD"
+MAX_REPAIR_ROUNDS = 2
+
+# Transcript-mode quiz generation
+MAX_QUIZ_QUESTIONS = 50
+SECTION_CHARS = 4000          # Transcript characters per Gemini call (at most one call per question)
+SECTION_WORKERS = 4           # Concurrent section requests
+DUPLICATE_THRESHOLD = 0.8     # Cosine similarity above which questions are duplicates
+HASH_DIMENSIONS = 2 ** 12     # Hashed bag-of-words vector size
+
+# JSON schema requested from Gemini for structured quiz output
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "question": {"type": "string"},
+        "options": {"type": "array", "items": {"type": "string"}},
+        "answer": {"type": "string"},
+        "source": {"type": "string"},
+    },
+    "required": ["question", "options", "answer", "source"],
+}
+QUIZ_SCHEMA = {"type": "array", "items": QUESTION_SCHEMA}
+
+
+def _json_generation_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+    }
+
+
+def _repair_json(raw: str) -> Any:
+    """Parse model JSON output, fixing common small defects locally"""
+    text = raw.strip()
+    # Strip markdown code fences
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    # Normalize smart quotes
+    text = text.translate(str.maketrans({"\u201c": '"', "\u201d": '"', "\u2018": "'", "\u2019": "'"}))
+
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    # Keep only the outermost JSON value and drop trailing commas
+    starts = [i for i in (text.find("["), text.find("{")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON found in model output")
+    start = min(starts)
+    end = max(text.rfind("]"), text.rfind("}"))
+    text = re.sub(r",\s*([\]}])", r"\1", text[start:end + 1])
+    return json.loads(text)
+
+
+def _normalize_question(item: Any) -> Optional[Dict[str, Any]]:
+    """Validate a single question, returning None if it cannot be repaired"""
+    if not isinstance(item, dict):
+        return None
+
+    question = str(item.get("question", "")).strip()
+    options = item.get("options")
+    if not question or not isinstance(options, list) or len(options) != len(OPTION_LETTERS):
+        return None
+
+    # Drop "(A) " / "A. " prefixes the model sometimes adds
+    options = [re.sub(r"^\(?[A-Da-d][\).:]\s+", "", str(option)).strip() for option in options]
+    if not all(options) or len(set(options)) != len(options):
+        return None
+
+    answer = item.get("answer")
+    if isinstance(answer, int) and 0 <= answer < len(options):
+        answer = OPTION_LETTERS[answer]
+    else:
+        answer = str(answer or "").strip()
+        letter = re.fullmatch(r"\(?([A-Da-d])\)?", answer)
+        if letter:
+            answer = letter.group(1).upper()
+        elif answer in options:
+            answer = OPTION_LETTERS[options.index(answer)]
+        else:
+            return None
+
+    return {
+        "question": question,
+        "options": options,
+        "answer": answer,
+        "source": str(item.get("source", "")).strip(),
+    }
+
+
+def parse_quiz_response(raw: str, expected: int) -> Tuple[List[Optional[Dict[str, Any]]], List[int]]:
     """
-    Generate 5 multiple choice questions from the given summary
-    
-    Args:
-        summary: Text summary to generate quiz from
-        
+    Parse and validate a structured quiz response
+
     Returns:
-        Formatted quiz questions or error message
+        The question slots (None where invalid) and the indices that need regeneration
     """
-    if not summary or len(summary.strip()) < 20:
-        return "Summary too short to generate meaningful quiz questions."
-    
-    if not model:
-        return "Quiz generation unavailable: Gemini API not configured properly."
-    
-    prompt = f"""Based on the following content, create 5 multiple choice questions to test understanding:
+    try:
+        data = _repair_json(raw)
+    except ValueError as e:
+        logger.warning(f"Quiz response is not valid JSON: {e}")
+        data = []
+
+    if isinstance(data, dict):
+        data = data.get("questions", [data])
+    if not isinstance(data, list):
+        data = []
+
+    questions = [_normalize_question(item) for item in data[:expected]]
+    questions += [None] * (expected - len(questions))
+    failed = [i for i, question in enumerate(questions) if question is None]
+    return questions, failed
+
+
+def _attach_source_segments(questions: List[Dict[str, Any]], segments: List[Dict[str, Any]]) -> None:
+    """Link each question to the transcript segment its source quote overlaps most"""
+    segment_words = [set(re.findall(r"\w+", segment["text"].lower())) for segment in segments]
+    for question in questions:
+        words = set(re.findall(r"\w+", (question["source"] or question["question"]).lower()))
+        scores = [len(words & seg_words) for seg_words in segment_words]
+        best = max(range(len(scores)), key=scores.__getitem__, default=None)
+        if best is not None and scores[best] > 0:
+            question["source_segment"] = {"start": segments[best]["start"], "end": segments[best]["end"]}
+        else:
+            question["source_segment"] = None
+
+
+def _structured_prompt(summary: str, count: int, avoid: List[str]) -> str:
+    avoid_text = "\n".join(f"- {question}" for question in avoid)
+    return f"""Based on the following content, create {count} multiple choice question(s) to test understanding.
 
 CONTENT:
 {summary}
 
 REQUIREMENTS:
-- Generate exactly 5 questions
-- Each question should have 4 options: (A), (B), (C), (D)
-- Mark the correct answer clearly
+- Return a JSON array with exactly {count} object(s)
+- Each object has "question", "options" (4 strings without letter prefixes), "answer" (one of A, B, C, D) and "source" (the sentence from the content the question is based on)
 - Questions should test different aspects of the content
 - Make questions clear and unambiguous
-- Focus on key concepts and facts
+{f"- Do not repeat these questions:{chr(10)}{avoid_text}" if avoid else ""}"""
+
+
+def generate_quiz_questions(
+    summary: str,
+    num_questions: int = 5,
+    segments: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate structured multiple choice questions from the given summary
+
+    Invalid questions are regenerated individually instead of redoing the whole quiz.
+
+    Args:
+        summary: Text summary to generate quiz from
+        num_questions: Number of questions to generate
+        segments: Optional transcript segments used to locate each question's source
+
+    Returns:
+        List of question dicts with question, options, answer, source and source_segment
+    """
+    if not summary or len(summary.strip()) < 20:
+        raise ValueError("Summary too short to generate meaningful quiz questions.")
+
+    if not model:
+        raise RuntimeError("Quiz generation unavailable: Gemini API not configured properly.")
+
+    raw = client.generate(
+        _structured_prompt(summary, num_questions, []),
+        generation_config=_json_generation_config(QUIZ_SCHEMA),
+    )
+    questions, failed = parse_quiz_response(raw, num_questions)
+
+    for _ in range(MAX_REPAIR_ROUNDS):
+        if not failed:
+            break
+        logger.info(f"Regenerating {len(failed)} invalid quiz question(s)")
+        existing = [question["question"] for question in questions if question]
+        for index in failed:
+            raw = client.generate(
+                _structured_prompt(summary, 1, existing),
+                generation_config=_json_generation_config(QUIZ_SCHEMA),
+                use_cache=False,
+            )
+            replacement, _ = parse_quiz_response(raw, 1)
+            if replacement[0]:
+                questions[index] = replacement[0]
+                existing.append(replacement[0]["question"])
+        failed = [i for i, question in enumerate(questions) if question is None]
+
+    questions = [question for question in questions if question]
+    if not questions:
+        raise RuntimeError("Quiz generation failed: No valid questions returned from AI model.")
+
+    _attach_source_segments(questions, segments or [])
+    logger.info(f"✅ Structured quiz generated: {len(questions)} question(s) using {model_name}")
+    return questions
+
+
+def format_quiz_text(questions: List[Dict[str, Any]]) -> str:
+    """Render structured questions in the plain-text quiz format"""
+    blocks = []
+    for number, question in enumerate(questions, start=1):
+        lines = [f"Question {number}: {question['question']}"]
+        lines += [f"({letter}) {option}" for letter, option in zip(OPTION_LETTERS, question["options"])]
+        lines.append(f"Correct Answer: ({question['answer']})")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
 
-FORMAT:
-Question 1: [Your question here]
-(A) First option
-(B) Second option
-(C) Third option
-(D) Fourth option
-Correct Answer: (X)
 
-[Continue for all 5 questions]
+def _split_sections(
+    transcript: str,
+    segments: List[Dict[str, Any]],
+    section_chars: int = SECTION_CHARS,
+) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Group transcript segments (or sentences) into sections of roughly section_chars"""
+    if not segments:
+        sentences = re.split(r"(?<=[.!?])\s+", transcript.strip())
+        segments = [{"start": None, "end": None, "text": sentence} for sentence in sentences if sentence]
 
-Please ensure all questions are based on the provided content."""
+    sections, current, size = [], [], 0
+    for segment in segments:
+        if current and size + len(segment["text"]) > section_chars:
+            sections.append(current)
+            current, size = [], 0
+        current.append(segment)
+        size += len(segment["text"]) + 1
+    if current:
+        sections.append(current)
 
+    return [(" ".join(segment["text"] for segment in section), section) for section in sections]
+
+
+def _evenly_spaced(total: int, count: int) -> List[int]:
+    """Indices of count items spread over range(total), one from the middle of each equal stretch"""
+    return [int((i + 0.5) * total / count) for i in range(count)]
+
+
+def _generate_section_candidates(
+    section_text: str,
+    section_segments: List[Dict[str, Any]],
+    count: int,
+) -> List[Dict[str, Any]]:
+    """Generate candidate questions for one transcript section"""
     try:
-        response = model.generate_content(prompt)
+        raw = client.generate(
+            _structured_prompt(section_text, count, []),
+            generation_config=_json_generation_config(QUIZ_SCHEMA),
+        )
+    except Exception as e:
+        logger.warning(f"Section quiz generation failed: {e}")
+        return []
+
+    questions, _ = parse_quiz_response(raw, count)
+    questions = [question for question in questions if question]
+    if section_segments[0]["start"] is not None:
+        _attach_source_segments(questions, section_segments)
+    else:
+        for question in questions:
+            question["source_segment"] = None
+    return questions
+
+
+def _question_vectors(questions: List[Dict[str, Any]]) -> np.ndarray:
+    """L2-normalized hashed bag-of-words vectors of question text plus correct answer"""
+    vectors = np.zeros((len(questions), HASH_DIMENSIONS), dtype=np.float32)
+    for row, question in enumerate(questions):
+        answer = question["options"][OPTION_LETTERS.index(question["answer"])]
+        for word in re.findall(r"\w+", f"{question['question']} {answer}".lower()):
+            vectors[row, zlib.crc32(word.encode()) % HASH_DIMENSIONS] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def deduplicate_questions(
+    questions: List[Dict[str, Any]],
+    threshold: float = DUPLICATE_THRESHOLD,
+) -> List[Dict[str, Any]]:
+    """Drop near-identical questions, keeping the first occurrence"""
+    if len(questions) < 2:
+        return list(questions)
+
+    vectors = _question_vectors(questions)
+    similarity = vectors @ vectors.T
+    # Only compare each question against earlier ones
+    duplicate = np.triu(similarity >= threshold, k=1).any(axis=0)
+
+    # A question only counts as a duplicate of a question that is kept
+    keep = np.ones(len(questions), dtype=bool)
+    for index in np.flatnonzero(duplicate):
+        if (similarity[:index, index][keep[:index]] >= threshold).any():
+            keep[index] = False
+    return [question for question, kept in zip(questions, keep) if kept]
+
+
+def generate_quiz_from_transcript(
+    transcript: str,
+    num_questions: int = 5,
+    segments: Optional[List[Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generate structured questions from the full transcript, section by section
+
+    At most num_questions sections, evenly spaced across the lecture, are sent to
+    Gemini concurrently, so cost follows the questions asked for rather than the
+    lecture length. Near-duplicate questions are removed locally and the rest are
+    picked evenly across the sampled sections.
+
+    Args:
+        transcript: Full transcript text
+        num_questions: Number of questions to return (up to MAX_QUIZ_QUESTIONS)
+        segments: Optional transcript segments used for sectioning and source lookup
+
+    Returns:
+        List of question dicts in the same shape as generate_quiz_questions
+    """
+    if not transcript or len(transcript.strip()) < 20:
+        raise ValueError("Transcript too short to generate meaningful quiz questions.")
+
+    if not model:
+        raise RuntimeError("Quiz generation unavailable: Gemini API not configured properly.")
+
+    num_questions = max(1, min(num_questions, MAX_QUIZ_QUESTIONS))
+    sections = _split_sections(transcript, segments or [])
+    if len(sections) > num_questions:
+        picks = _evenly_spaced(len(sections), num_questions)
+        sections = [sections[index] for index in picks]
+    # Oversample slightly so deduplication still leaves enough questions
+    per_section = math.ceil(num_questions / len(sections)) + 1
+
+    with ThreadPoolExecutor(max_workers=min(SECTION_WORKERS, len(sections))) as executor:
+        # Copy the context per task so Gemini usage is attributed to the calling job
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _generate_section_candidates, text, section_segments, per_section,
+            )
+            for text, section_segments in sections
+        ]
+        candidates = [future.result() for future in futures]
+
+    for index, questions in enumerate(candidates):
+        for question in questions:
+            question["section"] = index
+
+    unique = deduplicate_questions([question for questions in candidates for question in questions])
+    by_section = [[question for question in unique if question["section"] == index] for index in range(len(sections))]
+
+    selected = []
+    while len(selected) < num_questions and any(by_section):
+        available = [questions for questions in by_section if questions]
+        remaining = num_questions - len(selected)
+        if remaining < len(available):
+            # Spread the last partial round across the lecture instead of taking the first sections
+            picks = _evenly_spaced(len(available), remaining)
+            available = [available[index] for index in picks]
+        for questions in available:
+            selected.append(questions.pop(0))
+
+    if not selected:
+        raise RuntimeError("Quiz generation failed: No valid questions returned from AI model.")
+
+    logger.info(
+        f"✅ Transcript quiz generated: {len(selected)}/{num_questions} question(s) "
+        f"from {len(sections)} section(s) using {model_name}"
+    )
+    return selected
+
+
+def generate_quiz(summary: str) -> str:
+    """
+    Generate 5 multiple choice questions from the given summary
+    
+    Args:
+        summary: Text summary to generate quiz from
         
-        if hasattr(response, 'text') and response.text:
-            quiz_text = response.text.strip()
-            logger.info(f"✅ Quiz generated successfully using {model_name}")
-            return quiz_text
-        else:
-            logger.error("❌ No quiz content returned from Gemini")
-            return "Quiz generation failed: No content returned from AI model."
+    Returns:
+        Formatted quiz questions or error message
+    """
+    if not summary or len(summary.strip()) < 20:
+        return "Summary too short to generate meaningful quiz questions."
     
+    if not model:
+        return "Quiz generation unavailable: Gemini API not configured properly."
+    
+    try:
+        return format_quiz_text(generate_quiz_questions(summary))
     except Exception as e:
         logger.error(f"❌ Quiz generation failed with {model_name}: {e}")
         return f"Quiz generation error: {str(e)}"
@@ -0,0 +1,207 @@
+"""
+Central CPU budget for the processing pipeline
+
+Whisper and BART (torch intra-op threads), FFmpeg encodes and the worker pool
+all draw on the same cores. The governor sizes each of them from the cores
+this process may actually use, so concurrent jobs split the machine instead
+of each assuming they own it.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORES_PER_JOB = 4
+
+# Stages that mostly wait on remote APIs only need one core of the job's slot
+LIGHT_STAGES = ("quiz_generation", "translation", "captions")
+
+# Core slot leased by the job running in this context
+_current_slot: contextvars.ContextVar[Optional[Tuple[int, ...]]] = contextvars.ContextVar(
+    "current_core_slot", default=None
+)
+
+
+def _env_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+def detect_cores() -> List[int]:
+    """CPU ids this process may run on, trimmed to the cgroup CPU quota if one is set"""
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cores = list(range(os.cpu_count() or 1))
+
+    # Containers often allow every CPU but cap the quota (cgroup v2 cpu.max)
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cores = cores[:max(1, int(int(quota) / int(period)))]
+    except (OSError, ValueError):
+        pass
+    return cores
+
+
+class ResourceGovernor:
+    """
+    Splits the available cores into one slot per worker, pipeline and background
+
+    Every job, and every background task such as HLS packaging, leases a slot
+    for its lifetime. Its torch and FFmpeg thread counts equal the slot size,
+    and with pinning enabled each stage runs pinned to the slot's cores (FFmpeg
+    child processes inherit the mask).
+    """
+
+    def __init__(
+        self,
+        cores: Optional[List[int]] = None,
+        workers: Optional[int] = None,
+        pinning: bool = False,
+        background_workers: int = 0,
+    ):
+        self.cores = cores or detect_cores()
+        count = len(self.cores)
+        self.background_workers = max(0, background_workers)
+        default_workers = max(1, count // DEFAULT_CORES_PER_JOB - self.background_workers)
+        self.workers = max(1, min(workers or default_workers, count))
+        slots = self.workers + self.background_workers
+        self.threads_per_job = max(1, count // slots)
+        self.ffmpeg_threads = _env_int("SNAPSTUDY_FFMPEG_THREADS") or self.threads_per_job
+        self.torch_threads = _env_int("SNAPSTUDY_TORCH_THREADS") or self.threads_per_job
+        self.pinning = pinning and hasattr(os, "sched_setaffinity")
+
+        # With fewer cores than slots, slots wrap around and share cores
+        self._free_slots = [
+            tuple(self.cores[(i * self.threads_per_job + k) % count] for k in range(self.threads_per_job))
+            for i in range(slots)
+        ]
+        self._lock = threading.Lock()
+        self._stage_totals: Dict[str, Dict[str, float]] = {}
+        self._started_wall = time.monotonic()
+        self._started_cpu = self._process_cpu_seconds()
+
+        logger.info(
+            f"Resource governor: {count} core(s), {self.workers} worker(s) + {self.background_workers} background, "
+            f"{self.torch_threads} torch / {self.ffmpeg_threads} FFmpeg thread(s) per job, "
+            f"pinning {'on' if self.pinning else 'off'}"
+        )
+
+    @classmethod
+    def from_env(cls) -> "ResourceGovernor":
+        cores = detect_cores()
+        limit = _env_int("SNAPSTUDY_CPU_CORES")
+        if limit:
+            cores = cores[:limit]
+        return cls(
+            cores=cores,
+            workers=_env_int("SNAPSTUDY_WORKERS"),
+            pinning=os.getenv("SNAPSTUDY_CPU_PINNING") == "1",
+            background_workers=int(os.getenv("SNAPSTUDY_BACKGROUND_WORKERS", "1")),
+        )
+
+    def apply_torch_threads(self) -> None:
+        """Size torch's intra-op pool; call before the models are loaded"""
+        try:
+            import torch
+        except ImportError:
+            return
+        torch.set_num_threads(self.torch_threads)
+        try:
+            # Concurrency comes from the worker pool, not from inter-op parallelism
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only settable before the first parallel torch operation
+            pass
+        logger.info(f"✅ torch using {self.torch_threads} intra-op thread(s)")
+
+    @contextmanager
+    def job_slot(self) -> Iterator[Tuple[int, ...]]:
+        """Lease a core slot for the job (or background task) running on this thread"""
+        with self._lock:
+            # The scheduler never runs more jobs than workers and the background pool
+            # has its own slots, so one is normally free; callers that bypass both
+            # share every core
+            slot = self._free_slots.pop() if self._free_slots else None
+        token = _current_slot.set(slot or tuple(self.cores))
+        try:
+            yield _current_slot.get()
+        finally:
+            _current_slot.reset(token)
+            if slot is not None:
+                with self._lock:
+                    self._free_slots.append(slot)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Pin the calling thread to the job's cores for a stage and record its CPU use"""
+        slot = _current_slot.get()
+        previous = None
+        if self.pinning and slot:
+            cores = slot[:1] if name in LIGHT_STAGES else slot
+            try:
+                previous = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, cores)
+            except OSError as e:
+                logger.warning(f"Could not pin stage '{name}' to cores {cores}: {e}")
+                previous = None
+
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_started
+            cpu = time.thread_time() - cpu_started
+            if previous is not None:
+                os.sched_setaffinity(0, previous)
+            with self._lock:
+                totals = self._stage_totals.setdefault(name, {"runs": 0, "wall_seconds": 0.0, "thread_cpu_seconds": 0.0})
+                totals["runs"] += 1
+                totals["wall_seconds"] += wall
+                totals["thread_cpu_seconds"] += cpu
+
+    @staticmethod
+    def _process_cpu_seconds() -> float:
+        """CPU time of this process and its finished children (FFmpeg)"""
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
+
+    def report(self) -> Dict[str, Any]:
+        """Thread budget and CPU utilization since start, for the health endpoint"""
+        wall = time.monotonic() - self._started_wall
+        cpu = self._process_cpu_seconds() - self._started_cpu
+        with self._lock:
+            free_slots = len(self._free_slots)
+            stages = {
+                name: {
+                    "runs": int(totals["runs"]),
+                    "wall_seconds": round(totals["wall_seconds"], 2),
+                    "thread_cpu_seconds": round(totals["thread_cpu_seconds"], 2),
+                }
+                for name, totals in self._stage_totals.items()
+            }
+        try:
+            load = [round(value, 2) for value in os.getloadavg()]
+        except OSError:
+            load = None
+        return {
+            "cores": len(self.cores),
+            "workers": self.workers,
+            "background_workers": self.background_workers,
+            "busy_slots": self.workers + self.background_workers - free_slots,
+            "torch_threads": self.torch_threads,
+            "ffmpeg_threads": self.ffmpeg_threads,
+            "pinning": self.pinning,
+            "cpu_utilization": round(cpu / (wall * len(self.cores)), 3) if wall > 0 else 0.0,
+            "load_average": load,
+            "stages": stages,
+        }
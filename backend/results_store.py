@@ -0,0 +1,355 @@
+"""
+Persistent results store backed by SQLite (WAL mode) with indexed lookups
+and FTS5 full-text search over transcript segments
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    filename TEXT,
+    target_lang TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_hash_lang ON results (content_hash, target_lang, created_at);
+CREATE INDEX IF NOT EXISTS idx_results_created ON results (created_at, id);
+CREATE INDEX IF NOT EXISTS idx_results_lang_created ON results (target_lang, created_at, id);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    result_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_result ON segments (result_id);
+-- External-content index over segments; the triggers keep it in sync
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text,
+    content = 'segments',
+    content_rowid = 'id',
+    tokenize = 'porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TABLE IF NOT EXISTS fingerprint_sources (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    duration REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hash INTEGER NOT NULL,
+    source_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints (hash);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_source ON fingerprints (source_id);
+"""
+
+MAX_PAGE_SIZE = 100
+MAX_SEARCH_TERMS = 16
+
+# Very common words match most segments and only slow ranking down
+STOPWORDS = frozenset("""
+a an and are as at be but by did do does for from had has have how i in is it
+its of on or so that the their then there these they this to was we were what
+when where which who why will with you your
+""".split())
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA-256 content hash of a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultsStore:
+    """Stores pipeline results so they can be fetched again without reprocessing"""
+
+    def __init__(self, db_path: str = "snapstudy.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._init_schema()
+        logger.info(f"Results store ready: {db_path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return a per-thread connection (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        # Databases from before the segments table kept segment metadata in the FTS table itself
+        legacy = "result_id" in {row["name"] for row in conn.execute("PRAGMA table_info(segments_fts)")}
+        if legacy:
+            conn.execute("ALTER TABLE segments_fts RENAME TO segments_fts_legacy")
+        conn.executescript(SCHEMA)
+        if legacy:
+            conn.execute(
+                "INSERT INTO segments (result_id, start, end, text) "
+                "SELECT result_id, start, end, text FROM segments_fts_legacy"
+            )
+            conn.execute("DROP TABLE segments_fts_legacy")
+            logger.info("Migrated transcript search index to the segments table")
+        conn.commit()
+
+    def save_result(
+        self,
+        results: Dict[str, Any],
+        content_hash: str,
+        target_lang: str,
+        filename: Optional[str] = None,
+        status: str = "completed",
+        result_id: Optional[str] = None,
+    ) -> str:
+        """Persist a pipeline result and return its id
+
+        Passing an existing result_id replaces that result (e.g. after a retried job).
+        """
+        result_id = result_id or uuid.uuid4().hex
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM segments WHERE result_id = ?", (result_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO results (id, content_hash, filename, target_lang, status, created_at, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (result_id, content_hash, filename, target_lang, status, time.time(), json.dumps(results)),
+            )
+            conn.executemany(
+                "INSERT INTO segments (text, result_id, start, end) VALUES (?, ?, ?, ?)",
+                [
+                    (segment["text"], result_id, segment["start"], segment["end"])
+                    for segment in results.get("segments") or []
+                    if segment.get("text")
+                ],
+            )
+        logger.info(f"Stored result {result_id} ({status})")
+        return result_id
+
+    def get_result(self, result_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch a single result by id"""
+        row = self._connect().execute(
+            "SELECT * FROM results WHERE id = ?", (result_id,)
+        ).fetchone()
+        return self._row_to_result(row) if row else None
+
+    def find_by_hash(
+        self,
+        content_hash: str,
+        target_lang: Optional[str] = None,
+        statuses: Tuple[str, ...] = ("completed",),
+    ) -> Optional[Dict[str, Any]]:
+        """Return the latest result with one of the given statuses for the same file contents (and language, if given)"""
+        clauses = ["content_hash = ?", f"status IN ({', '.join('?' * len(statuses))})"]
+        params: List[Any] = [content_hash, *statuses]
+        if target_lang is not None:
+            clauses.append("target_lang = ?")
+            params.append(target_lang)
+        row = self._connect().execute(
+            f"SELECT * FROM results WHERE {' AND '.join(clauses)} ORDER BY created_at DESC LIMIT 1",
+            params,
+        ).fetchone()
+        return self._row_to_result(row) if row else None
+
+    def list_results(
+        self,
+        limit: int = 20,
+        before: Optional[str] = None,
+        target_lang: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        List results newest first using keyset pagination
+
+        Args:
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            before: Cursor returned as ``next_cursor`` by the previous page
+            target_lang: Optional language filter
+
+        Returns:
+            Dict with ``items`` (result metadata) and ``next_cursor``
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+
+        if target_lang:
+            clauses.append("target_lang = ?")
+            params.append(target_lang)
+
+        if before:
+            created_at, _, last_id = before.partition("_")
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([float(created_at), float(created_at), last_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            "SELECT id, content_hash, filename, target_lang, status, created_at FROM results "
+            f"{where} ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = f"{last['created_at']!r}_{last['id']}"
+
+        return {"items": items, "next_cursor": next_cursor}
+
+    def search_segments(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Full-text search across all stored transcript segments
+
+        Args:
+            query: Free-text query; non-stopword terms are OR-ed and ranked with BM25
+            limit: Maximum number of hits (capped at MAX_PAGE_SIZE)
+
+        Returns:
+            Ranked hits with result id, segment start/end and a highlighted snippet
+        """
+        words = re.findall(r"\w+", query.lower())
+        terms = [word for word in words if word not in STOPWORDS][:MAX_SEARCH_TERMS]
+        if terms:
+            match = " OR ".join(f'"{term}"' for term in terms)
+        elif words:
+            # Only common words: OR-ing them would rank nearly every segment, so match the phrase
+            match = '"' + " ".join(words[:MAX_SEARCH_TERMS]) + '"'
+        else:
+            return []
+
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        rows = self._connect().execute(
+            "SELECT s.result_id, s.start, s.end, "
+            "snippet(segments_fts, 0, '[', ']', '...', 16) AS snippet, f.rank AS score, "
+            "r.filename, r.target_lang "
+            "FROM segments_fts AS f JOIN segments AS s ON s.id = f.rowid "
+            "JOIN results AS r ON r.id = s.result_id "
+            "WHERE segments_fts MATCH ? ORDER BY f.rank LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def save_fingerprint(self, content_hash: str, hashes, offsets, duration: float) -> None:
+        """Index an audio fingerprint (see fingerprint.py), replacing any previous one"""
+        conn = self._connect()
+        with conn:
+            row = conn.execute("SELECT id FROM fingerprint_sources WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM fingerprints WHERE source_id = ?", (row["id"],))
+                conn.execute("DELETE FROM fingerprint_sources WHERE id = ?", (row["id"],))
+            source_id = conn.execute(
+                "INSERT INTO fingerprint_sources (content_hash, duration, created_at) VALUES (?, ?, ?)",
+                (content_hash, duration, time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO fingerprints (hash, source_id, offset) VALUES (?, ?, ?)",
+                ((int(h), source_id, int(o)) for h, o in zip(hashes, offsets)),
+            )
+        logger.info(f"Indexed fingerprint for {content_hash[:12]} ({len(hashes)} hashes)")
+
+    def match_fingerprint(
+        self,
+        hashes,
+        offsets,
+        exclude_hash: Optional[str] = None,
+        min_aligned: int = 1,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the indexed recording sharing the most hashes at one consistent offset
+
+        Returns:
+            Dict with the matched ``content_hash`` and ``duration``, the frame
+            ``delta`` (stored offset minus query offset), the number of
+            ``aligned`` hashes and the query ``matched_offsets`` that aligned,
+            or None when nothing reaches min_aligned
+        """
+        conn = self._connect()
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS fingerprint_query (hash INTEGER, offset INTEGER)")
+        conn.execute("DELETE FROM fingerprint_query")
+        conn.executemany(
+            "INSERT INTO fingerprint_query (hash, offset) VALUES (?, ?)",
+            ((int(h), int(o)) for h, o in zip(hashes, offsets)),
+        )
+        try:
+            candidates = conn.execute(
+                "SELECT f.source_id, f.offset - q.offset AS delta, COUNT(*) AS votes "
+                "FROM fingerprint_query AS q JOIN fingerprints AS f ON f.hash = q.hash "
+                "JOIN fingerprint_sources AS s ON s.id = f.source_id "
+                "WHERE s.content_hash IS NOT ? "
+                "GROUP BY f.source_id, delta ORDER BY votes DESC LIMIT 10",
+                (exclude_hash,),
+            ).fetchall()
+            if not candidates:
+                return None
+
+            # Re-encoding shifts frames slightly, so neighbouring deltas vote together
+            best = max(
+                candidates,
+                key=lambda c: sum(
+                    o["votes"] for o in candidates
+                    if o["source_id"] == c["source_id"] and abs(o["delta"] - c["delta"]) <= 1
+                ),
+            )
+            matched = conn.execute(
+                "SELECT DISTINCT q.rowid, q.offset FROM fingerprint_query AS q "
+                "JOIN fingerprints AS f ON f.hash = q.hash "
+                "WHERE f.source_id = ? AND f.offset - q.offset BETWEEN ? AND ?",
+                (best["source_id"], best["delta"] - 1, best["delta"] + 1),
+            ).fetchall()
+            if len(matched) < min_aligned:
+                return None
+
+            source = conn.execute(
+                "SELECT content_hash, duration FROM fingerprint_sources WHERE id = ?", (best["source_id"],)
+            ).fetchone()
+            return {
+                "content_hash": source["content_hash"],
+                "duration": source["duration"],
+                "delta": best["delta"],
+                "aligned": len(matched),
+                "matched_offsets": [row["offset"] for row in matched],
+            }
+        finally:
+            conn.execute("DELETE FROM fingerprint_query")
+            conn.commit()
+
+    def _row_to_result(self, row: sqlite3.Row) -> Dict[str, Any]:
+        result = json.loads(row["payload"])
+        result.update({
+            "result_id": row["id"],
+            "content_hash": row["content_hash"],
+            "filename": row["filename"],
+            "target_lang": row["target_lang"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+        })
+        return result
@@ -0,0 +1,207 @@
+"""
+Processing queue with priority classes, weighted fair queuing across tenants,
+a shortest-job-first boost and per-tenant concurrency caps
+"""
+
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+# Strict priority classes; lower rank is always served first
+PRIORITY_CLASSES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = "normal"
+
+SJF_THRESHOLD_SECONDS = 600   # Recordings shorter than this get the shortest-job-first boost
+SJF_BOOST = 0.5               # Cost multiplier applied to short jobs
+FINISHED_JOB_HISTORY = 1000   # Finished jobs kept for status lookups
+
+
+@dataclass
+class Job:
+    id: str
+    tenant: str
+    priority: str
+    cost: float
+    func: Callable
+    args: tuple
+    kwargs: dict
+    future: Future
+    duration: Optional[float] = None
+    virtual_start: float = 0.0
+    virtual_finish: float = 0.0
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    state: str = "queued"
+
+
+class FairScheduler:
+    """
+    Runs submitted jobs on a fixed worker pool
+
+    Within a priority class, jobs are ordered by their weighted-fair-queuing
+    finish tag: every tenant accrues virtual time proportional to the cost of
+    its jobs divided by its weight, so one tenant submitting many long jobs
+    cannot starve others. Short jobs have their cost discounted.
+    """
+
+    def __init__(
+        self,
+        workers: int = 2,
+        tenant_concurrency: int = 1,
+        tenant_weights: Optional[Dict[str, float]] = None,
+    ):
+        self.workers = workers
+        self.tenant_concurrency = tenant_concurrency
+        self.tenant_weights = tenant_weights or {}
+
+        self._pending: List[Job] = []
+        self._jobs: Dict[str, Job] = {}
+        self._finished: List[str] = []
+        self._running: Dict[str, int] = {}
+        self._tenant_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._condition = threading.Condition()
+
+        for index in range(workers):
+            threading.Thread(
+                target=self._worker_loop, name=f"snapstudy-worker-{index}", daemon=True
+            ).start()
+        logger.info(f"Scheduler started: {workers} worker(s), {tenant_concurrency} concurrent job(s) per tenant")
+
+    def submit(
+        self,
+        func: Callable,
+        *args,
+        tenant: str = "anonymous",
+        priority: str = DEFAULT_PRIORITY,
+        cost: float = 1.0,
+        job_id: Optional[str] = None,
+        duration: Optional[float] = None,
+        **kwargs,
+    ) -> Job:
+        """
+        Queue a job
+
+        Args:
+            func: Callable to run on a worker thread
+            tenant: Fairness key (API key or client address)
+            priority: One of PRIORITY_CLASSES
+            cost: Estimated work, e.g. media duration in seconds
+            job_id: Optional id to use instead of a generated one
+            duration: Media duration in seconds; decides the shortest-job-first
+                boost when given, since cost may be weighted (e.g. by resolution)
+
+        Returns:
+            The queued Job; wait on job.future for the result
+        """
+        priority = priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+        cost = max(float(cost), 1.0)
+        length = cost if duration is None else float(duration)
+        effective_cost = cost * SJF_BOOST if length < SJF_THRESHOLD_SECONDS else cost
+        weight = self.tenant_weights.get(tenant, 1.0)
+
+        job = Job(
+            id=job_id or uuid.uuid4().hex,
+            tenant=tenant,
+            priority=priority,
+            cost=cost,
+            duration=duration,
+            func=func,
+            args=args,
+            kwargs=kwargs,
+            future=Future(),
+        )
+
+        with self._condition:
+            job.virtual_start = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+            job.virtual_finish = job.virtual_start + effective_cost / weight
+            self._tenant_finish[tenant] = job.virtual_finish
+            self._pending.append(job)
+            self._jobs[job.id] = job
+            self._condition.notify()
+
+        logger.info(f"Queued job {job.id} for {tenant} ({priority}, cost {cost:.0f})")
+        return job
+
+    def _next_job(self) -> Optional[Job]:
+        """Pick the runnable job with the best (priority, finish tag); caller holds the lock"""
+        runnable = [
+            job for job in self._pending
+            if self._running.get(job.tenant, 0) < self.tenant_concurrency
+        ]
+        if not runnable:
+            return None
+        job = min(runnable, key=lambda j: (PRIORITY_CLASSES[j.priority], j.virtual_finish, j.submitted_at))
+        self._pending.remove(job)
+        return job
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+                self._running[job.tenant] = self._running.get(job.tenant, 0) + 1
+                self._virtual_time = max(self._virtual_time, job.virtual_start)
+                job.state = "running"
+                job.started_at = time.time()
+
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.func(*job.args, **job.kwargs))
+                    job.state = "completed"
+                except BaseException as e:
+                    logger.error(f"Job {job.id} failed: {e}", exc_info=True)
+                    job.future.set_exception(e)
+                    job.state = "failed"
+            else:
+                job.state = "cancelled"
+
+            with self._condition:
+                job.finished_at = time.time()
+                self._running[job.tenant] -= 1
+                self._finished.append(job.id)
+                while len(self._finished) > FINISHED_JOB_HISTORY:
+                    self._jobs.pop(self._finished.pop(0), None)
+                # A slot for this tenant opened up
+                self._condition.notify_all()
+
+    def job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Public view of a job's state"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if not job:
+                return None
+            position = None
+            if job.state == "queued":
+                order = sorted(self._pending, key=lambda j: (PRIORITY_CLASSES[j.priority], j.virtual_finish))
+                position = order.index(job)
+            return {
+                "job_id": job.id,
+                "state": job.state,
+                "priority": job.priority,
+                "cost": job.cost,
+                "duration": job.duration,
+                "queue_position": position,
+                "submitted_at": job.submitted_at,
+                "started_at": job.started_at,
+                "finished_at": job.finished_at,
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and running jobs per tenant"""
+        with self._condition:
+            return {
+                "workers": self.workers,
+                "queued": len(self._pending),
+                "running": sum(self._running.values()),
+                "running_by_tenant": {tenant: count for tenant, count in self._running.items() if count},
+            }
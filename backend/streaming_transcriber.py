@@ -0,0 +1,286 @@
+"""
+Memory-bounded transcription for long recordings
+
+Audio is decoded by FFmpeg straight from the video into fixed-size PCM windows,
+so neither the full WAV nor the full waveform ever exists. Each window is
+transcribed on its own and its segments are appended to a JSONL file on disk
+as soon as they complete.
+
+The memory ceiling is opt-in (memory_limit_mb). It is checked before each
+window and aborts only the current transcription with MemoryLimitExceeded;
+it does not cap or kill the process.
+"""
+
+import gc
+import json
+import wave
+import logging
+import time
+import resource
+import subprocess
+from pathlib import Path
+from typing import Iterator, Tuple, Optional, List, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000           # Whisper's expected input rate
+BYTES_PER_SAMPLE = 2          # s16le
+DEFAULT_WINDOW_SECONDS = 120    # Short enough that the decode time budget is checked often
+BOUNDARY_SECONDS = 1.0        # A window whose last segment ends this close to the cut may have split a word
+MAX_CARRY_SECONDS = 30.0      # Longest tail re-decoded with the next window (one Whisper segment)
+
+
+class MemoryLimitExceeded(RuntimeError):
+    """Raised when the process grows past the configured memory ceiling"""
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is the peak (KB on Linux), the best available fallback
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stream_pcm_windows(
+    media_path: str,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Decode mono 16 kHz audio from any FFmpeg-readable input one window at a time
+
+    Yields:
+        (offset in seconds, float32 waveform in [-1, 1]) per window
+    """
+    command = [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", str(media_path),
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-",
+    ]
+    window_bytes = window_seconds * SAMPLE_RATE * BYTES_PER_SAMPLE
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+    try:
+        offset = 0.0
+        buffer = bytearray(window_bytes)
+        view = memoryview(buffer)
+        while True:
+            filled = 0
+            while filled < window_bytes:
+                read = process.stdout.readinto(view[filled:])
+                if not read:
+                    break
+                filled += read
+            # Drop a trailing odd byte so the buffer holds whole samples
+            filled -= filled % BYTES_PER_SAMPLE
+            if filled == 0:
+                break
+
+            samples = np.frombuffer(buffer, dtype=np.int16, count=filled // BYTES_PER_SAMPLE)
+            yield offset, samples.astype(np.float32) / 32768.0
+            offset += filled / (SAMPLE_RATE * BYTES_PER_SAMPLE)
+
+            if filled < window_bytes:
+                break
+    finally:
+        view.release()
+        process.stdout.close()
+        stderr = process.stderr.read().decode(errors="replace").strip()
+        process.stderr.close()
+        returncode = process.wait()
+        if returncode not in (0, None) and stderr:
+            logger.warning(f"FFmpeg audio stream ended with code {returncode}: {stderr[-500:]}")
+
+
+def wav_windows(
+    wav_path: str,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """
+    Read an extracted 16 kHz WAV one window at a time (same output as stream_pcm_windows)
+
+    WAVs at another rate or sample width are resampled through FFmpeg instead.
+    """
+    with wave.open(str(wav_path), "rb") as wav:
+        if wav.getframerate() != SAMPLE_RATE or wav.getsampwidth() != BYTES_PER_SAMPLE:
+            convert = True
+        else:
+            convert = False
+            channels = wav.getnchannels()
+            window_frames = window_seconds * SAMPLE_RATE
+            offset = 0.0
+            while True:
+                raw = wav.readframes(window_frames)
+                if not raw:
+                    break
+                samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+                if channels > 1:
+                    samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+                yield offset, samples
+                offset += len(samples) / SAMPLE_RATE
+    if convert:
+        yield from stream_pcm_windows(wav_path, window_seconds)
+
+
+def transcribe_streaming(
+    whisper_model,
+    media_path: str,
+    segments_path: str,
+    window_seconds: int = DEFAULT_WINDOW_SECONDS,
+    memory_limit_mb: Optional[float] = None,
+    time_budget: Optional[float] = None,
+    degraded_options: Optional[Dict[str, Any]] = None,
+    **decode_options,
+) -> Dict[str, Any]:
+    """Transcribe a recording decoded by FFmpeg straight from the video (see transcribe_windows)"""
+    return transcribe_windows(
+        whisper_model, stream_pcm_windows(media_path, window_seconds), segments_path,
+        memory_limit_mb=memory_limit_mb, time_budget=time_budget,
+        degraded_options=degraded_options, **decode_options,
+    )
+
+
+def _mark_last(windows: Iterator[Tuple[float, np.ndarray]]) -> Iterator[Tuple[float, np.ndarray, bool]]:
+    """Yield (offset, waveform, is_last), looking one window ahead"""
+    iterator = iter(windows)
+    current = next(iterator, None)
+    while current is not None:
+        following = next(iterator, None)
+        yield current[0], current[1], following is None
+        current = following
+
+
+def transcribe_windows(
+    whisper_model,
+    windows: Iterator[Tuple[float, np.ndarray]],
+    segments_path: str,
+    memory_limit_mb: Optional[float] = None,
+    time_budget: Optional[float] = None,
+    degraded_options: Optional[Dict[str, Any]] = None,
+    **decode_options,
+) -> Dict[str, Any]:
+    """
+    Transcribe a recording window by window with a hard memory ceiling
+
+    Windows are cut at fixed lengths, so when speech runs up to a cut the last
+    segment is dropped and its audio is decoded again at the start of the next
+    window; cuts therefore land in a pause between segments, not inside a word.
+    The previous text is passed as a prompt only when the active options
+    condition on previous text.
+
+    Args:
+        whisper_model: Loaded Whisper model
+        windows: (offset seconds, waveform) pairs, e.g. from stream_pcm_windows or wav_windows
+        segments_path: JSONL file that receives segments as each window completes
+        memory_limit_mb: Abort with MemoryLimitExceeded if RSS exceeds this
+        time_budget: Allowed decode seconds per audio second; after a window overruns
+            it, the remaining windows use degraded_options
+        degraded_options: Cheaper decode options used after a budget overrun
+        **decode_options: Passed through to whisper_model.transcribe
+
+    Returns:
+        Dict with duration, segment count, segments_path, peak RSS in MB and
+        the number of windows decoded with degraded options
+    """
+    segments_path = Path(segments_path)
+    segments_path.parent.mkdir(parents=True, exist_ok=True)
+
+    duration = 0.0
+    count = 0
+    previous_text = ""
+    degraded_windows = 0
+    options = decode_options
+
+    carry: Optional[Tuple[float, np.ndarray]] = None
+
+    with open(segments_path, "w", encoding="utf-8") as out:
+        for offset, waveform, is_last in _mark_last(windows):
+            if carry is not None:
+                offset, waveform = carry[0], np.concatenate((carry[1], waveform))
+                carry = None
+
+            if memory_limit_mb:
+                rss = current_rss_mb()
+                if rss > memory_limit_mb:
+                    gc.collect()
+                    rss = current_rss_mb()
+                if rss > memory_limit_mb:
+                    raise MemoryLimitExceeded(
+                        f"RSS {rss:.0f} MB exceeds limit of {memory_limit_mb:.0f} MB at {offset:.0f}s"
+                    )
+
+            window_seconds_actual = len(waveform) / SAMPLE_RATE
+            # Carry the tail of the previous window as context, unless the profile turns conditioning off
+            prompt = previous_text[-200:] if options.get("condition_on_previous_text") else ""
+            started = time.perf_counter()
+            result = whisper_model.transcribe(waveform, initial_prompt=prompt or None, **options)
+            elapsed = time.perf_counter() - started
+            segments = result.get("segments", [])
+
+            if not is_last and len(segments) > 1:
+                cut = float(segments[-1]["start"])
+                runs_to_cut = float(segments[-1]["end"]) > window_seconds_actual - BOUNDARY_SECONDS
+                if runs_to_cut and 0 < cut and window_seconds_actual - cut <= MAX_CARRY_SECONDS:
+                    carry = (offset + cut, waveform[int(cut * SAMPLE_RATE):].copy())
+                    segments = segments[:-1]
+            duration = carry[0] if carry else offset + window_seconds_actual
+            del waveform
+
+            if options is not decode_options:
+                degraded_windows += 1
+            elif time_budget and degraded_options and elapsed > time_budget * window_seconds_actual:
+                logger.warning(
+                    f"Window at {offset:.0f}s took {elapsed:.1f}s (budget {time_budget * window_seconds_actual:.1f}s); "
+                    "decoding remaining windows without temperature fallback"
+                )
+                options = {**decode_options, **degraded_options}
+
+            for segment in segments:
+                text = segment["text"].strip()
+                if not text:
+                    continue
+                entry = {
+                    "start": round(offset + float(segment["start"]), 2),
+                    "end": round(offset + float(segment["end"]), 2),
+                    "text": text,
+                }
+                if segment.get("words"):
+                    entry["words"] = [
+                        {
+                            "start": round(offset + float(word["start"]), 2),
+                            "end": round(offset + float(word["end"]), 2),
+                            "word": word["word"],
+                        }
+                        for word in segment["words"]
+                    ]
+                out.write(json.dumps(entry) + "\n")
+                count += 1
+                previous_text = text
+            out.flush()
+            logger.info(f"Streamed window at {offset:.0f}s: {count} segments so far, RSS {current_rss_mb():.0f} MB")
+
+    return {
+        "duration": round(duration, 2),
+        "segment_count": count,
+        "segments_path": str(segments_path),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "degraded_windows": degraded_windows,
+    }
+
+
+def read_segments(segments_path: str) -> List[Dict[str, Any]]:
+    """Load segments written by transcribe_streaming"""
+    with open(segments_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
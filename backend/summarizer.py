@@ -4,15 +4,30 @@
 Production-grade text summarization with proper error handling
 """
 
+import os
 import logging
-from transformers import pipeline
-import torch
+from typing import Optional
+
+from extractive import select_key_sentences
+from fake_backends import FAKE_BACKENDS, FakeSummarizer
+
+if not FAKE_BACKENDS:
+    from transformers import pipeline
+    import torch
 
 logger = logging.getLogger(__name__)
 
+# Extractive pre-filter: rank transcript sentences and pass only the best to the model
+PREFILTER_ENABLED = os.getenv("SNAPSTUDY_SUMMARY_PREFILTER", "1") == "1"
+TOKEN_BUDGET = int(os.getenv("SNAPSTUDY_SUMMARY_TOKEN_BUDGET", "512"))
+
 # Initialize summarizer with error handling
 def initialize_summarizer():
     """Initialize the summarization pipeline with fallbacks"""
+    if FAKE_BACKENDS:
+        logger.info("✅ Using in-process fake summarizer")
+        return FakeSummarizer(), "fake"
+    
     try:
         device = 0 if torch.cuda.is_available() else -1
         
@@ -46,12 +61,20 @@ def initialize_summarizer():
 # Initialize at module level
 summarizer, model_type = initialize_summarizer()
 
-def summarize_text(text: str) -> str:
+def _count_tokens(text: str) -> int:
+    return len(summarizer.tokenizer.encode(text, add_special_tokens=False))
+
+
+def summarize_text(text: str, prefilter: Optional[bool] = None, token_budget: Optional[int] = None) -> str:
     """
     Summarize the given text using the loaded model
     
     Args:
         text: Input text to summarize
+        prefilter: Select key sentences before the abstractive model
+            (defaults to SNAPSTUDY_SUMMARY_PREFILTER)
+        token_budget: Model input budget for the pre-filter
+            (defaults to SNAPSTUDY_SUMMARY_TOKEN_BUDGET)
         
     Returns:
         Summarized text or error message
@@ -66,23 +89,30 @@ def summarize_text(text: str) -> str:
         # Prepare text based on model type
         if model_type == "t5":
             # T5 requires "summarize: " prefix
-            input_text = f"summarize: {text}"
+            prefix = "summarize: "
             max_input_length = 512
         else:
             # BART doesn't need prefix
-            input_text = text
+            prefix = ""
             max_input_length = 1024
         
-        # Limit input length
-        if len(input_text) > max_input_length:
-            input_text = input_text[:max_input_length]
+        if prefilter if prefilter is not None else PREFILTER_ENABLED:
+            # Key sentences from the whole transcript, within the model's token window
+            budget = min(token_budget or TOKEN_BUDGET, summarizer.tokenizer.model_max_length, max_input_length)
+            input_text = prefix + select_key_sentences(text, budget - 8, count_tokens=_count_tokens)
+        else:
+            # Limit input length
+            input_text = f"{prefix}{text}"
+            if len(input_text) > max_input_length:
+                input_text = input_text[:max_input_length]
         
         # Generate summary
         summary_result = summarizer(
             input_text, 
             max_length=300, 
             min_length=100, 
-            do_sample=False
+            do_sample=False,
+            truncation=True
         )
         
         if summary_result and len(summary_result) > 0:
@@ -101,5 +131,5 @@ def get_summarizer_info() -> dict:
     return {
         "available": summarizer is not None,
         "model_type": model_type,
-        "device": "GPU" if torch.cuda.is_available() else "CPU"
+        "device": "GPU" if not FAKE_BACKENDS and torch.cuda.is_available() else "CPU"
     }
\ No newline at end of file
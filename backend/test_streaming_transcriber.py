@@ -0,0 +1,69 @@
+"""
+Memory ceiling of the windowed transcriber on a long synthetic recording
+
+Run with: python -m pytest test_streaming_transcriber.py
+No FFmpeg or Whisper needed: a real 16 kHz WAV is read through wav_windows,
+the path regular uploads use, and the model is a stand-in.
+"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from streaming_transcriber import (
+    MemoryLimitExceeded, SAMPLE_RATE, current_rss_mb, peak_rss_mb, read_segments, transcribe_windows, wav_windows,
+)
+
+RECORDING_SECONDS = 2 * 3600
+WINDOW_SECONDS = 60
+# The full 2 h waveform alone would be ~460 MB of float32; one window is ~4 MB
+RSS_GROWTH_CAP_MB = 150
+
+
+@pytest.fixture(scope="module")
+def long_wav(tmp_path_factory):
+    """A 2 h mono 16 kHz WAV of noise, written a minute at a time"""
+    path = tmp_path_factory.mktemp("audio") / "lecture.wav"
+    chunk = np.random.default_rng(0).integers(-3000, 3000, 60 * SAMPLE_RATE, dtype=np.int16).tobytes()
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        for _ in range(RECORDING_SECONDS // 60):
+            wav.writeframes(chunk)
+    return str(path)
+
+
+class StubModel:
+    """One segment per window; keeps nothing between calls"""
+
+    def transcribe(self, waveform, **kwargs):
+        seconds = len(waveform) / SAMPLE_RATE
+        return {"segments": [{"start": 0.0, "end": seconds, "text": f" level {float(np.abs(waveform).mean()):.4f}"}]}
+
+
+def test_long_recording_stays_under_memory_cap(long_wav, tmp_path):
+    baseline = current_rss_mb()
+    # ru_maxrss is a process-wide high-water mark, so measure growth from where it already is
+    peak_before = peak_rss_mb()
+    cap = baseline + RSS_GROWTH_CAP_MB
+
+    stats = transcribe_windows(
+        StubModel(), wav_windows(long_wav, WINDOW_SECONDS), str(tmp_path / "lecture.segments.jsonl"),
+        memory_limit_mb=cap,
+    )
+
+    assert stats["duration"] == RECORDING_SECONDS
+    assert stats["segment_count"] == RECORDING_SECONDS // WINDOW_SECONDS
+    assert len(read_segments(stats["segments_path"])) == stats["segment_count"]
+    assert current_rss_mb() < cap
+    assert stats["peak_rss_mb"] < max(peak_before, baseline) + RSS_GROWTH_CAP_MB
+
+
+def test_memory_limit_aborts_the_job(long_wav, tmp_path):
+    with pytest.raises(MemoryLimitExceeded):
+        transcribe_windows(
+            StubModel(), wav_windows(long_wav, WINDOW_SECONDS), str(tmp_path / "lecture.segments.jsonl"),
+            memory_limit_mb=1,
+        )
@@ -0,0 +1,86 @@
+"""
+Whisper decode-time profiles trading transcription speed against accuracy
+"""
+
+import os
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Options passed straight to whisper's transcribe(); "time_budget" is ours (see below)
+TRANSCRIPTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Greedy decoding, no temperature fallback and no cross-window conditioning,
+    # which also prevents repetition loops on noisy audio
+    "fast": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": (0.0,),
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+        "time_budget": 0.5,
+    },
+    # Greedy first pass with a short fallback ladder for the chunks that need it
+    "balanced": {
+        "beam_size": None,
+        "best_of": 2,
+        "temperature": (0.0, 0.4, 0.8),
+        "condition_on_previous_text": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+        "time_budget": 1.0,
+    },
+    # Beam search with Whisper's full fallback ladder
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "condition_on_previous_text": True,
+        "compression_ratio_threshold": 2.4,
+        "logprob_threshold": -1.0,
+        "no_speech_threshold": 0.6,
+        "time_budget": None,
+    },
+}
+
+DEFAULT_PROFILE = os.getenv("SNAPSTUDY_TRANSCRIBE_PROFILE", "balanced")
+if DEFAULT_PROFILE not in TRANSCRIPTION_PROFILES:
+    logger.warning(f"Unknown transcription profile '{DEFAULT_PROFILE}', using 'balanced'")
+    DEFAULT_PROFILE = "balanced"
+
+# Profile used once a window has blown its time budget
+DEGRADED_PROFILE = "fast"
+
+
+def resolve_profile(name: Optional[str]) -> str:
+    """Return a valid profile name, falling back to the deployment default"""
+    return name if name in TRANSCRIPTION_PROFILES else DEFAULT_PROFILE
+
+
+def decode_options(name: Optional[str]) -> Dict[str, Any]:
+    """Whisper transcribe() keyword arguments for a profile"""
+    options = dict(TRANSCRIPTION_PROFILES[resolve_profile(name)])
+    options.pop("time_budget")
+    return options
+
+
+def time_budget(name: Optional[str]) -> Optional[float]:
+    """
+    Decode-time budget as a fraction of audio duration (None = unlimited)
+
+    The windowed transcription path compares each window's decode time with
+    budget * window length; after an overrun the remaining windows are decoded
+    with the DEGRADED_PROFILE options, which never re-decode at higher temperatures.
+    """
+    return TRANSCRIPTION_PROFILES[resolve_profile(name)]["time_budget"]
+
+
+def describe_profile(name: Optional[str]) -> Dict[str, Any]:
+    """Profile summary for the health endpoint"""
+    resolved = resolve_profile(name)
+    options = dict(TRANSCRIPTION_PROFILES[resolved])
+    options["temperature"] = list(options["temperature"])
+    return {"name": resolved, "options": options, "available": list(TRANSCRIPTION_PROFILES)}
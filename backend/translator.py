@@ -3,7 +3,12 @@ Production-grade text translation with error handling
 """
 
 import logging
-from deep_translator import GoogleTranslator
+from fake_backends import FAKE_BACKENDS
+
+if FAKE_BACKENDS:
+    from fake_backends import FakeTranslator as GoogleTranslator
+else:
+    from deep_translator import GoogleTranslator
 
 logger = logging.getLogger(__name__)
 
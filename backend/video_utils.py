@@ -34,9 +34,117 @@ def ensure_ffmpeg_available():
     
     return False
 
-def extract_audio(video_path: str) -> Optional[str]:
+def probe_media(media_path: str) -> Optional[dict]:
+    """
+    Fast pre-flight inspection with ffprobe (reads container headers, no decoding)
+
+    Returns:
+        Dict with duration, format, bit rate and video/audio stream details,
+        or None if the file cannot be parsed as media
+
+    Raises:
+        OSError: ffprobe itself cannot be run (a server problem, not a bad upload)
+    """
+    import json
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error",
+                "-show_entries",
+                "format=duration,bit_rate,format_name,size:"
+                "stream=codec_type,codec_name,width,height,sample_rate,channels,avg_frame_rate,duration:"
+                "stream_tags=DURATION",
+                "-of", "json",
+                str(media_path),
+            ],
+            capture_output=True, text=True, timeout=15,
+        )
+        if result.returncode != 0:
+            logger.warning(f"ffprobe failed for {media_path}: {result.stderr.strip()}")
+            return None
+        data = json.loads(result.stdout or "{}")
+    except (ValueError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not probe {media_path}: {e}")
+        return None
+
+    fmt = data.get("format", {})
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    def number(value, cast=float):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    # MediaRecorder WebM often has no container duration: try the streams, then the packets
+    duration = number(fmt.get("duration"))
+    if not duration:
+        stream_durations = [number(stream.get("duration")) for stream in streams]
+        stream_durations += [_tag_seconds((stream.get("tags") or {}).get("DURATION")) for stream in streams]
+        duration = max((value for value in stream_durations if value), default=None)
+    if not duration and audio is not None:
+        duration = _demuxed_duration(media_path)
+
+    return {
+        "duration": duration,
+        "format": fmt.get("format_name"),
+        "bit_rate": number(fmt.get("bit_rate"), int),
+        "size": number(fmt.get("size"), int),
+        "has_video": video is not None,
+        "video_codec": video.get("codec_name") if video else None,
+        "width": number(video.get("width"), int) if video else None,
+        "height": number(video.get("height"), int) if video else None,
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "sample_rate": number(audio.get("sample_rate"), int) if audio else None,
+        "channels": number(audio.get("channels"), int) if audio else None,
+    }
+
+def _tag_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Matroska "HH:MM:SS.fraction" DURATION tag"""
+    try:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _demuxed_duration(media_path: str) -> Optional[float]:
+    """End time of the last audio packet; demuxes the whole file but decodes nothing"""
+    import subprocess
+
+    try:
+        result = subprocess.run(
+            [
+                "ffprobe", "-v", "error", "-select_streams", "a:0",
+                "-show_entries", "packet=pts_time,duration_time", "-of", "csv=p=0",
+                str(media_path),
+            ],
+            capture_output=True, text=True, timeout=120,
+        )
+    except subprocess.TimeoutExpired as e:
+        logger.warning(f"Could not scan {media_path} for its duration: {e}")
+        return None
+
+    for line in reversed(result.stdout.splitlines()):
+        try:
+            pts, _, length = line.partition(",")
+            return float(pts) + (float(length) if length and length != "N/A" else 0.0)
+        except ValueError:
+            continue
+    return None
+
+
+def extract_audio(video_path: str, audio_only: bool = False) -> Optional[str]:
     """
     Extract audio from video with enhanced error handling and FFmpeg validation
+
+    Audio-only input (audio_only=True) is converted by FFmpeg directly, since
+    MoviePy's VideoFileClip needs a video stream.
     """
     try:
         # Ensure FFmpeg is available
@@ -57,25 +165,41 @@ def extract_audio(video_path: str) -> Optional[str]:
         
         logger.info(f"Extracting audio from: {video_path}")
         
-        # Import moviepy after ensuring FFmpeg is available
-        from moviepy.video.io.VideoFileClip import VideoFileClip
-        
-        # Generate output path
+        # Generate output path (never the upload itself, e.g. for a .wav upload)
         audio_path = video_path.with_suffix('.wav')
+        if audio_path == video_path:
+            audio_path = video_path.with_suffix('.pcm.wav')
         
-        # Process video
-        with VideoFileClip(str(video_path)) as video:
-            if video.audio is None:
-                logger.error("No audio track found in video")
+        if audio_only:
+            import subprocess
+            result = subprocess.run(
+                [
+                    "ffmpeg", "-nostdin", "-y", "-hide_banner", "-loglevel", "error",
+                    "-i", str(video_path),
+                    "-vn", "-ac", "1", "-ar", "16000", "-c:a", "pcm_s16le", str(audio_path),
+                ],
+                capture_output=True, text=True,
+            )
+            if result.returncode != 0:
+                logger.error(f"FFmpeg audio conversion failed: {result.stderr.strip()[-500:]}")
                 return None
+        else:
+            # Import moviepy after ensuring FFmpeg is available
+            from moviepy.video.io.VideoFileClip import VideoFileClip
             
-            # Extract audio with optimal settings for Whisper
-            video.audio.write_audiofile(
-                str(audio_path),
-                logger=None,
-                codec='pcm_s16le',  # Uncompressed for better compatibility
-                ffmpeg_params=['-ar', '16000']  # 16kHz sample rate (Whisper optimized)
-            )
+            # Process video
+            with VideoFileClip(str(video_path)) as video:
+                if video.audio is None:
+                    logger.error("No audio track found in video")
+                    return None
+                
+                # Extract audio with optimal settings for Whisper
+                video.audio.write_audiofile(
+                    str(audio_path),
+                    logger=None,
+                    codec='pcm_s16le',  # Uncompressed for better compatibility
+                    ffmpeg_params=['-ar', '16000']  # 16kHz sample rate (Whisper optimized)
+                )
         
         # Validate output
         if not audio_path.exists():
@@ -96,9 +220,12 @@ def extract_audio(video_path: str) -> Optional[str]:
         logger.error(f"Audio extraction failed: {e}", exc_info=True)
         return None
 
-def clip_key_segments(video_path: str, max_clips: int = 1) -> List[str]:
+def clip_key_segments(video_path: str, max_clips: int = 1, threads: Optional[int] = None) -> List[str]:
     """
     Generate video clips with proper MoviePy method calls
+    
+    Args:
+        threads: FFmpeg encoder thread count (None = FFmpeg's default)
     """
     try:
         # Ensure FFmpeg is available
@@ -148,6 +275,7 @@ def clip_key_segments(video_path: str, max_clips: int = 1) -> List[str]:
                     audio_codec='aac',
                     logger=None,
                     preset='medium',
+                    threads=threads,
                     ffmpeg_params=['-crf', '23']
                 )
                 
@@ -173,4 +301,151 @@ def clip_key_segments(video_path: str, max_clips: int = 1) -> List[str]:
         return []
     except Exception as e:
         logger.error(f"Clip generation failed: {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+# HLS ladder: (name, height, video bitrate, max rate, buffer size)
+HLS_RENDITIONS = [
+    ("360p", 360, "800k", "856k", "1200k"),
+    ("720p", 720, "2800k", "2996k", "4200k"),
+]
+HLS_SEGMENT_SECONDS = 4
+SPRITE_INTERVAL = 10      # Seconds between thumbnail frames
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+
+
+def hls_renditions(source_height: Optional[int] = None) -> List[tuple]:
+    """Ladder entries no taller than the source; a source below the lowest rung gets one
+    rendition at its own height"""
+    if not source_height:
+        return HLS_RENDITIONS
+    renditions = [rendition for rendition in HLS_RENDITIONS if rendition[1] <= source_height]
+    if not renditions:
+        _name, _height, *rates = HLS_RENDITIONS[0]
+        renditions = [(f"{source_height}p", source_height, *rates)]
+    return renditions
+
+
+def build_hls_command(
+    video_path: str,
+    output_dir: str,
+    renditions: List[tuple] = HLS_RENDITIONS,
+    threads: int = 2,
+    has_audio: bool = True,
+) -> List[str]:
+    """
+    Build a single FFmpeg invocation producing every HLS rendition plus thumbnail sprites
+
+    The source is decoded once and split in a filter graph, so adding renditions does
+    not add decode passes.
+    """
+    output_dir = Path(output_dir)
+    count = len(renditions)
+
+    labels = "".join(f"[v{i}]" for i in range(count))
+    filters = [f"[0:v]split={count + 1}{labels}[vsprite]"]
+    for i, (name, height, *_rest) in enumerate(renditions):
+        filters.append(f"[v{i}]scale=-2:{height}[v{name}]")
+    filters.append(
+        f"[vsprite]fps=1/{SPRITE_INTERVAL},scale=160:-2,tile={SPRITE_COLUMNS}x{SPRITE_ROWS}[sprite]"
+    )
+
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-filter_complex_threads", str(threads),
+        "-i", str(video_path),
+        "-filter_complex", ";".join(filters),
+        "-threads", str(threads),
+    ]
+
+    stream_map = []
+    for i, (name, height, bitrate, maxrate, bufsize) in enumerate(renditions):
+        command += ["-map", f"[v{name}]"]
+        if has_audio:
+            command += ["-map", "0:a:0"]
+        command += [
+            f"-b:v:{i}", bitrate, f"-maxrate:v:{i}", maxrate, f"-bufsize:v:{i}", bufsize,
+        ]
+        stream_map.append(f"v:{i},a:{i},name:{name}" if has_audio else f"v:{i},name:{name}")
+
+    command += [
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+        # Keyframes aligned with the segment length so every segment starts on one
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})", "-sc_threshold", "0",
+    ]
+    if has_audio:
+        command += ["-c:a", "aac", "-b:a", "96k", "-ac", "2"]
+    command += [
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        # Event playlists are readable as soon as the first segment is written
+        "-hls_playlist_type", "event",
+        "-hls_flags", "independent_segments",
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        "-hls_segment_filename", str(output_dir / "%v" / "segment_%05d.ts"),
+        str(output_dir / "%v" / "index.m3u8"),
+        # Second output of the same invocation: thumbnail sprite sheets
+        "-map", "[sprite]", "-fps_mode", "vfr", "-q:v", "5",
+        str(output_dir / "sprite_%03d.jpg"),
+    ]
+    return command
+
+
+def package_hls(
+    video_path: str,
+    output_dir: Optional[str] = None,
+    threads: int = 2,
+    has_audio: bool = True,
+    source_height: Optional[int] = None,
+) -> Optional[dict]:
+    """
+    Package a video into an adaptive-bitrate HLS ladder with thumbnail sprites
+
+    Args:
+        video_path: Source video
+        output_dir: Destination directory (default: hls/<video stem> next to the source)
+        threads: FFmpeg thread budget for the whole invocation
+        has_audio: Whether the source has an audio track to include
+        source_height: Source frame height; renditions taller than it are skipped
+
+    Returns:
+        Dict with the master playlist and sprite sheet paths, or None on failure
+    """
+    import subprocess
+
+    try:
+        if not ensure_ffmpeg_available():
+            logger.error("FFmpeg not available for HLS packaging")
+            return None
+
+        video_path = Path(video_path)
+        if not video_path.exists():
+            logger.error(f"Video file not found: {video_path}")
+            return None
+
+        output_dir = Path(output_dir) if output_dir else video_path.parent / "hls" / video_path.stem
+        renditions = hls_renditions(source_height)
+        for name, *_rest in renditions:
+            (output_dir / name).mkdir(parents=True, exist_ok=True)
+
+        command = build_hls_command(
+            str(video_path), str(output_dir), renditions, threads=threads, has_audio=has_audio,
+        )
+        logger.info(f"Packaging HLS for {video_path} with {threads} thread(s)")
+        result = subprocess.run(command, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            logger.error(f"HLS packaging failed: {result.stderr.strip()[-500:]}")
+            return None
+
+        sprites = sorted(str(path) for path in output_dir.glob("sprite_*.jpg"))
+        logger.info(f"HLS packaging complete: {output_dir}")
+        return {
+            "master_playlist": str(output_dir / "master.m3u8"),
+            "sprites": sprites,
+        }
+
+    except Exception as e:
+        logger.error(f"HLS packaging failed: {e}", exc_info=True)
+        return None
@@ -313,7 +313,7 @@ function App() {
                     <span className="px-2 py-1 bg-slate-800 rounded">AVI</span>
                     <span className="px-2 py-1 bg-slate-800 rounded">MOV</span>
                     <span className="px-2 py-1 bg-slate-800 rounded">MKV</span>
-                    <span className="px-2 py-1 bg-slate-800 rounded">Max 500MB</span>
+                    <span className="px-2 py-1 bg-slate-800 rounded">Max 4GB</span>
                   </div>
                 </div>
               ) : (
@@ -483,7 +483,7 @@ function App() {
                 )}
 
                 {activeTab === "quiz" && (
-                  <InteractiveQuiz quizData={response.quiz} />
+                  <InteractiveQuiz quizData={response.quiz} quizItems={response.quiz_items} />
                 )}
 
                 {activeTab === "translation" && (
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 
-const InteractiveQuiz = ({ quizData }) => {
+const InteractiveQuiz = ({ quizData, quizItems }) => {
   const [questions, setQuestions] = useState([]);
   const [currentQuestion, setCurrentQuestion] = useState(0);
   const [selectedAnswers, setSelectedAnswers] = useState({});
@@ -10,10 +10,12 @@ const InteractiveQuiz = ({ quizData }) => {
   const [clickIndicator, setClickIndicator] = useState(null);
 
   useEffect(() => {
-    if (quizData && typeof quizData === 'string') {
+    if (Array.isArray(quizItems) && quizItems.length > 0) {
+      loadQuizItems(quizItems);
+    } else if (quizData && typeof quizData === 'string') {
       parseQuizData(quizData);
     }
-  }, [quizData]);
+  }, [quizData, quizItems]);
 
   useEffect(() => {
     if (clickIndicator) {
@@ -22,6 +24,18 @@ const InteractiveQuiz = ({ quizData }) => {
     }
   }, [clickIndicator]);
 
+  const loadQuizItems = (items) => {
+    setQuestions(items.map((item, index) => ({
+      question: item.question,
+      options: item.options.map((text, optionIndex) => ({
+        letter: 'ABCD'.charAt(optionIndex),
+        text
+      })),
+      correctAnswer: item.answer,
+      id: index
+    })));
+  };
+
   const parseQuizData = (rawQuiz) => {
     try {
       const lines = rawQuiz.split('\n').filter(line => line.trim());